@@ -0,0 +1,87 @@
+import asyncio
+import logging
+import re
+
+from app.document_processor import PAGE_BREAK
+from app.gemini_client import UNAVAILABLE_MESSAGE, is_cacheable
+
+logger = logging.getLogger(__name__)
+
+
+def split_into_chunks(text: str, chunk_chars: int = 12000) -> list:
+    # Pack whole pages into chunks; pages larger than a chunk are split on blank lines
+    # (section/paragraph breaks) and, failing that, hard-cut
+    pieces = []
+    for page in text.split(PAGE_BREAK):
+        if len(page) <= chunk_chars:
+            pieces.append(page)
+            continue
+        for section in re.split(r"\n\s*\n", page):
+            while len(section) > chunk_chars:
+                pieces.append(section[:chunk_chars])
+                section = section[chunk_chars:]
+            pieces.append(section)
+
+    chunks = []
+    current = ""
+    for piece in pieces:
+        if not piece.strip():
+            continue
+        if current and len(current) + len(piece) + 1 > chunk_chars:
+            chunks.append(current)
+            current = ""
+        current = f"{current}\n{piece}" if current else piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+class DocumentAnalyzer:
+    # Map-reduce summary for long documents: chunks are summarized concurrently (at most
+    # max_parallel at once, on top of the client's global limit) and the partial summaries
+    # are merged into the usual 5-part structure.
+    def __init__(self, client, chunk_chars: int = 12000, max_parallel: int = 4, merge_batch: int = 12):
+        self.client = client
+        self.chunk_chars = chunk_chars
+        self.max_parallel = max_parallel
+        self.merge_batch = merge_batch
+
+    async def analyze(self, text: str, doc_type: str = "generic", language: str = None, progress=None) -> tuple:
+        # Returns (summary, skipped): skipped counts the chunks whose summary failed and so
+        # are missing from the result
+        chunks = split_into_chunks(text, self.chunk_chars)
+        if len(chunks) <= 1:
+            return await self.client.analyze_document(text, doc_type=doc_type, language=language), 0
+
+        total = len(chunks)
+        done = 0
+        semaphore = asyncio.Semaphore(self.max_parallel)
+
+        async def summarize(index, chunk):
+            nonlocal done
+            async with semaphore:
+                summary = await self.client.summarize_chunk(chunk, doc_type, index, total)
+            done += 1
+            if progress is not None:
+                await progress(done, total)
+            return summary
+
+        summaries = await asyncio.gather(*(summarize(i, c) for i, c in enumerate(chunks, start=1)))
+        summaries = [s for s in summaries if is_cacheable(s)]
+        if not summaries:
+            return UNAVAILABLE_MESSAGE, total
+        skipped = total - len(summaries)
+
+        # Very long documents: merge in batches until one merge call can take them all
+        while len(summaries) > self.merge_batch:
+            batches = [summaries[i:i + self.merge_batch] for i in range(0, len(summaries), self.merge_batch)]
+            merged = await asyncio.gather(*(self.client.merge_summaries(b, doc_type) for b in batches))
+            # A failed merge loses every chunk of its batch
+            skipped += sum(len(b) for b, m in zip(batches, merged) if not is_cacheable(m))
+            summaries = [s for s in merged if is_cacheable(s)]
+            if not summaries:
+                return UNAVAILABLE_MESSAGE, total
+
+        if skipped:
+            logger.warning(f"{skipped} of {total} chunks are missing from the summary")
+        return await self.client.merge_summaries(summaries, doc_type, language=language), skipped
@@ -0,0 +1,132 @@
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import zipfile
+
+from app.document_processor import PAGE_BREAK, open_source
+
+logger = logging.getLogger(__name__)
+
+
+class BatchItem:
+    # One uploaded file (or ZIP member) waiting to be part of a batch
+    __slots__ = ("file_id", "file_unique_id", "file_name", "file_ext", "size")
+
+    def __init__(self, file_id: str, file_unique_id: str, file_name: str, file_ext: str, size: int):
+        self.file_id = file_id
+        self.file_unique_id = file_unique_id
+        self.file_name = file_name
+        self.file_ext = file_ext.lower()
+        self.size = size
+
+
+class PendingBatch:
+    __slots__ = ("items", "deadline", "full")
+
+    def __init__(self, deadline: float):
+        self.items = []
+        self.deadline = deadline
+        self.full = asyncio.Event()
+
+
+class BatchCollector:
+    # Groups the files one sender sends in quick succession (an album, or a case bundle
+    # sent one file after another); keys are (chat_id, user_id). The first upload becomes the batch leader and waits until
+    # `window` seconds pass without a new file; later uploads just join its batch.
+    def __init__(self, window: float = 3.0, max_files: int = 20):
+        self.window = window
+        self.max_files = max_files
+        self._pending = {}
+
+    def join(self, key, item: BatchItem) -> tuple:
+        # Returns (batch, is_leader)
+        loop = asyncio.get_running_loop()
+        batch = self._pending.get(key)
+        leader = batch is None
+        if leader:
+            batch = self._pending[key] = PendingBatch(loop.time() + self.window)
+        batch.items.append(item)
+        batch.deadline = loop.time() + self.window
+        if len(batch.items) >= self.max_files:
+            # Close it now; the next upload starts a fresh batch
+            self._pending.pop(key, None)
+            batch.full.set()
+        return batch, leader
+
+    async def collect(self, key, batch: PendingBatch) -> list:
+        loop = asyncio.get_running_loop()
+        try:
+            while not batch.full.is_set():
+                remaining = batch.deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    await asyncio.wait_for(batch.full.wait(), remaining)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            if self._pending.get(key) is batch:
+                del self._pending[key]
+        return batch.items
+
+
+def unpack_zip(source, check, max_files: int, max_total_bytes: int) -> tuple:
+    # Returns ([(name, ext, data)], skipped names). `check(ext, size)` raises for members
+    # that are unsupported or over the per-format limit. Sizes come from the archive
+    # directory and reads are capped, so a zip bomb can't inflate past max_total_bytes.
+    members = []
+    skipped = []
+    total = 0
+    with zipfile.ZipFile(open_source(source)) as archive:
+        for info in archive.infolist():
+            name = os.path.basename(info.filename)
+            if info.is_dir() or not name or name.startswith(".") or info.filename.startswith("__MACOSX/"):
+                continue
+            ext = os.path.splitext(name)[1].lower()
+            if ext == ".zip" or len(members) >= max_files or total + info.file_size > max_total_bytes:
+                skipped.append(name)
+                continue
+            try:
+                check(ext, info.file_size)
+            except Exception:
+                skipped.append(name)
+                continue
+            with archive.open(info) as f:
+                data = f.read(info.file_size + 1)
+            if len(data) > info.file_size:
+                logger.warning(f"ZIP member {name} is larger than its declared size, skipping")
+                skipped.append(name)
+                continue
+            total += len(data)
+            members.append((name, ext, data))
+    return members, skipped
+
+
+def _page_key(page: str) -> str:
+    return hashlib.sha1(re.sub(r"\s+", " ", page).strip().lower().encode()).hexdigest()
+
+
+def merge_documents(documents: list) -> tuple:
+    # Concatenates [(name, text)] into one text, dropping pages already seen in an earlier
+    # file (copies of the FIR inside the chargesheet, the same order attached twice...).
+    # Returns (text, duplicate page count).
+    seen = set()
+    duplicates = 0
+    parts = []
+    for index, (name, text) in enumerate(documents, start=1):
+        pages = []
+        for page in text.split(PAGE_BREAK):
+            if not page.strip():
+                continue
+            key = _page_key(page)
+            if key in seen:
+                duplicates += 1
+                continue
+            seen.add(key)
+            pages.append(page)
+        if pages:
+            pages[0] = f"=== Document {index}: {name} ===\n{pages[0]}"
+            parts.append(PAGE_BREAK.join(pages))
+    return PAGE_BREAK.join(parts), duplicates
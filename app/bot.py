@@ -1,78 +1,197 @@
 
+import asyncio
+import functools
 import logging
 import os
 import sys
-import re
+import time
+import zipfile
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardMarkup
+from telegram.constants import ParseMode
 from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes, CallbackQueryHandler
-from config import TELEGRAM_BOT_TOKEN
-from app.gemini_client import GeminiClient
-from app.document_processor import DocumentProcessor
+from config import (
+    TELEGRAM_BOT_TOKEN, RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL, RESPONSE_CACHE_DB,
+    DOCUMENT_CACHE_MAX_BYTES, DOCUMENT_CACHE_TTL,
+    EXTRACTION_WORKERS, EXTRACTION_MAX_PENDING, EXTRACTION_TIMEOUT, EXTRACTION_MAX_CHARS, PDF_PAGES_PER_JOB,
+    OCR_DPI, OCR_MAX_DIMENSION, OCR_TIME_BUDGET, ANALYSIS_CHUNK_CHARS, ANALYSIS_MAX_PARALLEL,
+    DOC_SESSION_TTL, DOC_SESSION_MAX_BYTES, DOC_SESSION_CHUNK_CHARS, DOC_SESSION_TOP_K,
+    STREAM_RESPONSES, STREAM_EDIT_INTERVAL, GEMINI_RPM, GEMINI_TPM, CHAT_MAX_IN_FLIGHT, CHAT_MAX_DOCUMENTS,
+    SESSION_DB, SESSION_FLUSH_INTERVAL, SESSION_IDLE_TTL, STATUTE_INDEX_PATH, STATUTE_DIRECT_ANSWERS,
+    METRICS_HOST, METRICS_PORT, UPLOAD_MAX_BYTES_PDF, UPLOAD_MAX_BYTES_DOCX, UPLOAD_MAX_BYTES_IMAGE,
+    UPLOAD_MAX_BYTES_TEXT, UPLOAD_MAX_BYTES_ZIP, UPLOAD_MAX_PDF_PAGES, UPLOAD_SPOOL_BYTES, UPLOAD_TMP_DIR, UPLOAD_MAX_IN_FLIGHT_BYTES,
+    BATCH_WINDOW, BATCH_MAX_FILES, BATCH_MAX_BYTES, BATCH_MAX_PARALLEL,
+    TELEGRAM_GLOBAL_RATE, TELEGRAM_CHAT_RATE, TELEGRAM_CHAT_BURST, check_credentials,
+)
+from app.gemini_client import AsyncGeminiClient, StreamInterrupted, is_cacheable, document_question_prompt, case_assistance_prompt
+from app.extraction import ExtractionService, ExtractionQueueFull, ExtractionTimeout
+from app.cache import ResponseCache, DocumentCache, content_hash
+from app.outbound import OutboundSender, split_point
+from app.batch import BatchCollector, BatchItem, unpack_zip, merge_documents
+from app.uploads import UploadManager, UploadRejected, UploadBudgetExceeded
+from app.analysis import DocumentAnalyzer
+from app.concurrency import ChatLimiter, ChatUpdateProcessor, release_turn
+from app.intent import classify
+from app.statutes import StatuteIndex, is_direct_lookup
+from app.retrieval import DocumentSessionStore
+from app.persistence import SQLitePersistence
+from app.metrics import (
+    registry, log_event, request_seconds, correlation_id, new_correlation_id, CorrelationIdFilter, start_metrics_server,
+)
+from app.scheduler import GeminiScheduler, set_request_context, INTERACTIVE, BULK
 
 # Logging setup
 logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    format='%(asctime)s - %(name)s - %(levelname)s - [%(correlation_id)s] %(message)s',
     level=logging.INFO
 )
+for log_handler in logging.getLogger().handlers:
+    log_handler.addFilter(CorrelationIdFilter())
 logger = logging.getLogger(__name__)
 
-# Initialize clients
-gemini_client = GeminiClient()
-doc_processor = DocumentProcessor()
+# Initialize clients. The response cache (which may open a SQLite file) and the statute
+# index (read and indexed from disk) are built by on_startup.
+response_cache = None
+statute_index = None
+gemini_scheduler = GeminiScheduler(GEMINI_RPM, GEMINI_TPM)
+gemini_client = AsyncGeminiClient(scheduler=gemini_scheduler)
+document_sessions = DocumentSessionStore(DOC_SESSION_MAX_BYTES, DOC_SESSION_TTL, DOC_SESSION_CHUNK_CHARS)
+chat_limiter = ChatLimiter(CHAT_MAX_IN_FLIGHT, CHAT_MAX_DOCUMENTS)
+document_analyzer = DocumentAnalyzer(gemini_client, ANALYSIS_CHUNK_CHARS, ANALYSIS_MAX_PARALLEL)
+document_cache = DocumentCache(DOCUMENT_CACHE_MAX_BYTES, DOCUMENT_CACHE_TTL)
+extraction_service = ExtractionService(
+    EXTRACTION_WORKERS, EXTRACTION_MAX_PENDING, EXTRACTION_TIMEOUT,
+    max_chars=EXTRACTION_MAX_CHARS, pages_per_job=PDF_PAGES_PER_JOB, ocr_time_budget=OCR_TIME_BUDGET,
+    max_pages=UPLOAD_MAX_PDF_PAGES, processor_options={"ocr_dpi": OCR_DPI, "ocr_max_dimension": OCR_MAX_DIMENSION},
+)
+upload_manager = UploadManager(
+    {"pdf": UPLOAD_MAX_BYTES_PDF, "docx": UPLOAD_MAX_BYTES_DOCX,
+     "image": UPLOAD_MAX_BYTES_IMAGE, "text": UPLOAD_MAX_BYTES_TEXT, "zip": UPLOAD_MAX_BYTES_ZIP},
+    UPLOAD_MAX_IN_FLIGHT_BYTES, spool_bytes=UPLOAD_SPOOL_BYTES, tmp_dir=UPLOAD_TMP_DIR,
+)
+batch_collector = BatchCollector(BATCH_WINDOW, BATCH_MAX_FILES)
+
+# Queue depths and cache counters, read at scrape time
+registry.gauge("gemini_queue_depth", "Gemini calls waiting in the scheduler", lambda: gemini_scheduler.depth)
+registry.gauge("extraction_in_flight", "Documents being extracted", lambda: extraction_service.in_flight)
+registry.gauge("upload_in_flight_bytes", "Bytes of uploads held for download/extraction",
+               lambda: upload_manager.in_flight_bytes)
+registry.gauge("uploads_rejected_total", "Uploads refused for size or memory budget",
+               lambda: upload_manager.rejected, kind="counter")
+registry.gauge("chat_requests_in_flight", "Questions being answered", lambda: chat_limiter.in_flight())
+registry.gauge("requests_superseded_total", "Questions cancelled by a newer message",
+               lambda: chat_limiter.superseded, kind="counter")
+registry.gauge("requests_coalesced_total", "Requests served by an identical in-flight call",
+               lambda: gemini_client.coalescer.coalesced, kind="counter")
+registry.gauge("cache_hits_total", "Cache hits", lambda: {
+    (("cache", "response"),): response_cache.hits, (("cache", "document"),): document_cache.hits,
+}, kind="counter")
+registry.gauge("cache_misses_total", "Cache misses", lambda: {
+    (("cache", "response"),): response_cache.misses, (("cache", "document"),): document_cache.misses,
+}, kind="counter")
+# Overridden per process in webhook mode so each worker gets its own scrape port
+metrics_port = METRICS_PORT
+metrics_server = None
 
 # Constants
 DISCLAIMER = "\n\n⚠️ *Disclaimer*: This is legal information, not legal advice. Consult a licensed lawyer."
 MAX_MSG_LENGTH = 3500
+INTERRUPTED_NOTE = "\n\n⚠️ *Response interrupted*: the answer above is incomplete. Please ask again."
+PARTIAL_NOTE = (
+    "\n\n⚠️ *Incomplete summary*: {count} part(s) of the document could not be summarized and are "
+    "left out. Send the file again to retry."
+)
+
+outbound = OutboundSender(TELEGRAM_GLOBAL_RATE, TELEGRAM_CHAT_RATE, TELEGRAM_CHAT_BURST, MAX_MSG_LENGTH)
 
 # --- Helper Functions for Message Safety ---
-def format_for_telegram(text: str) -> str:
-    # Convert **bold** to <b>bold</b>
-    text = re.sub(r"\*\*(.*?)\*\*", r"<b>\1</b>", text)
-    # Optional: convert *italic*
-    text = re.sub(r"\*(.*?)\*", r"<i>\1</i>", text)
-    return text
+async def safe_send(chat_id, text, context):
+    # Converted to HTML once, split on paragraph/sentence boundaries, queued per chat
+    await outbound.send(context.bot, chat_id, text)
 
-def split_message(text):
-    return [text[i:i+MAX_MSG_LENGTH] for i in range(0, len(text), MAX_MSG_LENGTH)]
+async def edit_html(chat_id, message_id, text, context):
+    await outbound.edit(context.bot, chat_id, message_id, text, html=True)
 
-async def safe_send(chat_id, text, context):
-    chunks = split_message(text)
-    for chunk in chunks:
-        formatted_chunk = format_for_telegram(chunk)
-        try:
-            await context.bot.send_message(chat_id=chat_id, text=formatted_chunk, parse_mode="HTML")
-        except Exception as e:
-            # Fallback for HTML parsing errors
-            logger.error(f"HTML Parse Error: {e}")
-            await context.bot.send_message(chat_id=chat_id, text=chunk)
+async def reply(update, context, text, parse_mode=None, reply_markup=None):
+    # Message to the chat of this update (plain text unless parse_mode is given), queued
+    # with the rest of its output
+    *_, message = await outbound.send(
+        context.bot, update.effective_chat.id, text, html=False, parse_mode=parse_mode, reply_markup=reply_markup
+    )
+    return message
 
-# --- Helper Logic for Intent Detection ---
-def detect_intent(text: str) -> str:
-    text = text.lower()
-    
-    # Explain a Law
-    if any(k in text for k in ["section", "ipc", "act", "article", "law"]):
-        return "explain_law"
-    
-    # Case Assistance
-    if any(k in text for k in ["my case", "help", "win", "defend", "strength", "weakness"]):
-        return "case_assist"
-    
-    # Language
-    if any(k in text for k in ["hindi", "english", "telugu", "tamil", "urdu", "language"]):
-        return "change_lang"
+async def edit_status(update, context, status_msg, text):
+    await outbound.edit(context.bot, update.effective_chat.id, status_msg.message_id, text)
 
-    # FAQ or General Legal Question
-    if text.endswith("?") or len(text.split()) < 10: 
-        return "faq"
-    
-    return "general_query"
+async def stream_reply(update, context, status_msg, deltas):
+    # Progressive delivery: the status message becomes the first part of the answer and
+    # is edited as text arrives (at most every STREAM_EDIT_INTERVAL seconds). Once a part
+    # fills MAX_MSG_LENGTH it is finalized with formatting and a new message continues.
+    chat_id = update.effective_chat.id
+    message_id = status_msg.message_id
+    pending = ""
+    # The first text is shown as soon as it arrives; only later edits are throttled
+    last_edit = float("-inf")
+
+    try:
+        async for delta in deltas:
+            pending += delta
+            while len(pending) > MAX_MSG_LENGTH:
+                cut = split_point(pending, MAX_MSG_LENGTH)
+                await edit_html(chat_id, message_id, pending[:cut], context)
+                pending = pending[cut:].lstrip()
+                message, = await outbound.send(context.bot, chat_id, "✍️ ...", html=False)
+                message_id = message.message_id
+                last_edit = time.monotonic()
+            if pending.strip() and time.monotonic() - last_edit >= STREAM_EDIT_INTERVAL:
+                try:
+                    await outbound.edit(context.bot, chat_id, message_id, pending + " ✍️")
+                except Exception as e:
+                    logger.warning(f"Streaming edit failed: {e}")
+                last_edit = time.monotonic()
+    except StreamInterrupted as e:
+        logger.warning(f"Answer stream interrupted: {e}")
+        pending += INTERRUPTED_NOTE
+
+    pending += DISCLAIMER
+    if len(pending) > MAX_MSG_LENGTH:
+        cut = split_point(pending, MAX_MSG_LENGTH)
+        await edit_html(chat_id, message_id, pending[:cut], context)
+        await safe_send(chat_id, pending[cut:].lstrip(), context)
+    else:
+        await edit_html(chat_id, message_id, pending, context)
 
 # --- Handler Functions ---
 
+def instrumented(handler):
+    # Gives each update a correlation ID (stamped on every log line and span it produces)
+    # and records end-to-end handler time
+    @functools.wraps(handler)
+    async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        if correlation_id.get() != "-":
+            # Called from another handler (e.g. a menu button) - already being measured
+            return await handler(update, context)
+        token = new_correlation_id()
+        start = time.perf_counter()
+        outcome = "ok"
+        try:
+            await handler(update, context)
+        except BaseException:
+            outcome = "error"
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            request_seconds.observe(elapsed, handler=handler.__name__)
+            log_event(
+                "request", handler=handler.__name__, seconds=round(elapsed, 4), outcome=outcome,
+                chat_id=update.effective_chat.id if update.effective_chat else None,
+            )
+            correlation_id.reset(token)
+    return wrapper
+
+@instrumented
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     user_first_name = update.effective_user.first_name
     welcome_text = (
@@ -96,31 +215,40 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
     
-    await update.message.reply_markdown(welcome_text, reply_markup=reply_markup)
+    await reply(update, context, welcome_text, parse_mode=ParseMode.MARKDOWN, reply_markup=reply_markup)
 
 # Button Router
+@instrumented
 async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     query = update.callback_query
     await query.answer()
     data = query.data
+
+    # Ignore double-taps on the same button
+    tap = f"{data}:{query.message.message_id if query.message else ''}"
+    if context.user_data.get('last_tap') == tap and time.monotonic() - context.user_data.get('last_tap_at', 0) < 2:
+        return
+    context.user_data['last_tap'] = tap
+    context.user_data['last_tap_at'] = time.monotonic()
     
     # Set context state based on button
     context.user_data['active_intent'] = data
     
     if data == 'intent_explain_law':
-        await query.edit_message_text("Use /law <name> or just type the law name here (e.g. 'IPC 420').")
+        await edit_status(update, context, query.message, "Use /law <name> or just type the law name here (e.g. 'IPC 420').")
     elif data == 'intent_upload_case':
-        await query.edit_message_text("Please upload your case document (PDF, DOCX, or Image) now.")
+        await edit_status(update, context, query.message, "Please upload your case document (PDF, DOCX, or Image) now.")
     elif data == 'intent_case_assist':
-        await query.edit_message_text("I can help analyze your case strategy. Briefly describe your situation or ask 'How can I strengthen my case?'.")
+        await edit_status(update, context, query.message, "I can help analyze your case strategy. Briefly describe your situation or ask 'How can I strengthen my case?'.")
     elif data == 'intent_change_lang':
-        await query.edit_message_text("Please type your preferred language (e.g. 'Hindi', 'Telugu').")
+        await edit_status(update, context, query.message, "Please type your preferred language (e.g. 'Hindi', 'Telugu').")
     elif data == 'intent_faq':
-        await query.edit_message_text("Ask me a short legal question, or type 'FAQ' to see common ones.")
+        await edit_status(update, context, query.message, "Ask me a short legal question, or type 'FAQ' to see common ones.")
     elif data == 'intent_privacy':
         await privacy_command(update, context)
 
 # Text Handler (The Main Router)
+@instrumented
 async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     user_msg = update.message.text
     if user_msg.startswith("/"): return 
@@ -129,8 +257,10 @@ async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Non
     active_intent = context.user_data.get('active_intent')
     
     # 2. If no active state, detect intent from text
+    detected = None
     if not active_intent:
-        active_intent = detect_intent(user_msg)
+        detected = classify(user_msg)
+        active_intent = detected.intent
         # Map detected simple intent string to full intent key (optional, or just use identifying string)
         if active_intent == "explain_law": active_intent = 'intent_explain_law'
         elif active_intent == "case_assist": active_intent = 'intent_case_assist'
@@ -140,136 +270,366 @@ async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Non
     # 3. Reset state for next interaction (optional, depending on flow. For now, we reset after processing)
     context.user_data['active_intent'] = None 
 
-    status_msg = await update.message.reply_text("🔍 Processing...")
-
-    # Route based on detected or set intent
-    if active_intent == 'intent_explain_law':
-        await process_explanation(update, context, user_msg, status_msg)
-    elif active_intent == 'intent_case_assist':
-        await process_case_assistance(update, context, user_msg, status_msg)
-    elif active_intent == 'intent_change_lang':
-        await process_language_change(update, context, user_msg, status_msg)
-    elif active_intent == 'intent_faq':
-        # Pass FAQ input to Gemini as requested
-        await process_explanation(update, context, f"Answer this Legal FAQ briefly: {user_msg}", status_msg)
-    else:
-        # Fallback mechanism: Treat as general legal query
-        await process_explanation(update, context, user_msg, status_msg)
+    status_msg = await reply(update, context, "🔍 Processing...")
+
+    # A newer message from the same chat cancels this one if it is still running
+    with chat_limiter.supersede((update.effective_chat.id, update.effective_user.id)):
+        # Registered, so the chat's next message may start (and supersede this one)
+        release_turn()
+        # Follow-up about a document uploaded earlier in this chat (unless the user is
+        # switching language or naming a specific section)
+        if (detected is not None and active_intent != 'intent_change_lang' and not detected.entities
+                and document_sessions.has_session(update.effective_chat.id)):
+            if await process_document_question(update, context, user_msg, status_msg):
+                return
+
+        # Route based on detected or set intent
+        if active_intent == 'intent_explain_law':
+            await process_explanation(update, context, user_msg, status_msg)
+        elif active_intent == 'intent_case_assist':
+            await process_case_assistance(update, context, user_msg, status_msg)
+        elif active_intent == 'intent_change_lang':
+            await process_language_change(update, context, user_msg, status_msg)
+        elif active_intent == 'intent_faq':
+            # Pass FAQ input to Gemini as requested
+            await process_explanation(update, context, f"Answer this Legal FAQ briefly: {user_msg}", status_msg, user_msg)
+        else:
+            # Fallback mechanism: Treat as general legal query. Free text rarely repeats
+            # word for word, so it is not worth a cache entry.
+            await process_explanation(update, context, user_msg, status_msg, cacheable=False)
+
+def queue_notifier(update, context, status_msg):
+    # Tells the user where they stand when the scheduler makes their request wait
+    async def notify(position):
+        await edit_status(
+            update, context, status_msg,
+            f"⏳ High demand right now. You are #{position} in the queue, your answer will start shortly..."
+        )
+    return notify
 
-async def process_explanation(update, context, query, status_msg):
+async def process_explanation(update, context, query, status_msg, lookup_text=None, cacheable=True):
     try:
+        set_request_context(update.effective_chat.id, INTERACTIVE, queue_notifier(update, context, status_msg))
         user_lang = context.user_data.get('language')
-        response = gemini_client.get_legal_explanation(query, language=user_lang)
+
+        # Section references found in the local index: answer bare lookups directly (when
+        # no translation is needed), otherwise use them to ground the Gemini prompt
+        lookup_text = lookup_text or query
+        entries = statute_index.resolve(lookup_text)
+        english = not user_lang or user_lang.strip().lower() == "english"
+        if entries and STATUTE_DIRECT_ANSWERS and english and is_direct_lookup(lookup_text, entries):
+            await edit_status(update, context, status_msg, "📘 From the statute index:")
+            answer = "\n\n".join(entry.to_answer() for entry in entries)
+            await safe_send(update.effective_chat.id, answer + DISCLAIMER, context)
+            return
+        if not entries:
+            entries = [entry for _, entry in statute_index.search(lookup_text)]
+        references = [entry.to_reference() for entry in entries]
+
+        if STREAM_RESPONSES:
+            await stream_reply(update, context, status_msg, gemini_client.stream_legal_explanation(
+                query, language=user_lang, references=references, cacheable=cacheable
+            ))
+            return
+        response = await gemini_client.get_legal_explanation(
+            query, language=user_lang, references=references, cacheable=cacheable
+        )
         
         # Edit status to "Done" then safe send content
-        await context.bot.edit_message_text(
-            chat_id=update.effective_chat.id,
-            message_id=status_msg.message_id,
-            text="✅ Explanation Generated:"
-        )
+        await edit_status(update, context, status_msg, "✅ Explanation Generated:")
         await safe_send(update.effective_chat.id, response + DISCLAIMER, context)
+    except asyncio.CancelledError:
+        await mark_superseded(update, context, status_msg)
     except Exception as e:
         await handle_error(update, context, status_msg, e)
 
 async def process_case_assistance(update, context, query, status_msg):
     try:
+        set_request_context(update.effective_chat.id, INTERACTIVE, queue_notifier(update, context, status_msg))
         # Custom prompt for case assistance: "provide suggestion and help user to win"
-        prompt = f"""User Request for Case Assistance: "{query}"
-
-Please act as a Legal Strategy Assistant.
-Provide:
-1. Evaluation of the situation.
-2. Strategic suggestions to win or strengthen the case.
-3. Relevant laws that support this position.
-4. Evidence that should be gathered.
-
-Keep it practical and actionable.
-"""
+        prompt = case_assistance_prompt(query)
         # Call internal method to allow custom prompt
         user_lang = context.user_data.get('language')
-        response = gemini_client._call_gemini(prompt, language=user_lang)
+        if STREAM_RESPONSES:
+            await stream_reply(update, context, status_msg, gemini_client._stream_gemini(
+                prompt, language=user_lang, intent="case"
+            ))
+            return
+        response = await gemini_client._call_gemini(prompt, language=user_lang, intent="case")
         
-        await context.bot.edit_message_text(
-            chat_id=update.effective_chat.id,
-            message_id=status_msg.message_id,
-            text="✅ Strategy Analysis Generated:"
-        )
+        await edit_status(update, context, status_msg, "✅ Strategy Analysis Generated:")
         await safe_send(update.effective_chat.id, response + DISCLAIMER, context)
+    except asyncio.CancelledError:
+        await mark_superseded(update, context, status_msg)
     except Exception as e:
         await handle_error(update, context, status_msg, e)
 
+async def process_document_question(update, context, question, status_msg) -> bool:
+    # Returns False when nothing in the document matches, so the caller can route normally
+    excerpts = document_sessions.retrieve(update.effective_chat.id, question, DOC_SESSION_TOP_K)
+    if not excerpts:
+        return False
+    try:
+        set_request_context(update.effective_chat.id, INTERACTIVE, queue_notifier(update, context, status_msg))
+        user_lang = context.user_data.get('language')
+        prompt = document_question_prompt(question, excerpts)
+        if STREAM_RESPONSES:
+            await stream_reply(update, context, status_msg, gemini_client._stream_gemini(
+                prompt, language=user_lang, intent="question"
+            ))
+            return True
+        response = await gemini_client._call_gemini(prompt, language=user_lang, intent="question")
+
+        await edit_status(update, context, status_msg, "✅ Answer from your document:")
+        await safe_send(update.effective_chat.id, response + DISCLAIMER, context)
+    except asyncio.CancelledError:
+        await mark_superseded(update, context, status_msg)
+    except Exception as e:
+        await handle_error(update, context, status_msg, e)
+    return True
+
 async def process_language_change(update, context, lang, status_msg):
-    # Store language preference (mock session for now)
+    # Store language preference (persisted by SQLitePersistence)
     context.user_data['language'] = lang
-    await context.bot.edit_message_text(
-        chat_id=update.effective_chat.id,
-        message_id=status_msg.message_id,
-        text=f"✅ Language set to: {lang}. I will try to answer in {lang} from now on."
+    await edit_status(
+        update, context, status_msg, f"✅ Language set to: {lang}. I will try to answer in {lang} from now on."
     )
 
+async def mark_superseded(update, context, status_msg):
+    try:
+        await edit_status(update, context, status_msg, "⏭️ Skipped, answering your newer message instead.")
+    except Exception:
+        pass
+
 async def handle_error(update, context, status_msg, e):
     logger.error(f"Processing error: {e}", exc_info=True)
     try:
-        await context.bot.edit_message_text(
-            chat_id=update.effective_chat.id, 
-            message_id=status_msg.message_id, 
-            text=f"⚠️ Error: {str(e)}"
-        )
+        await edit_status(update, context, status_msg, f"⚠️ Error: {str(e)}")
     except:
         pass
 
+def progress_editor(update, context, status_msg):
+    # Status-message updates, throttled to stay under Telegram's edit rate limits
+    last_edit = 0
+
+    async def edit(text, final=False):
+        nonlocal last_edit
+        if not final and time.monotonic() - last_edit < 2:
+            return
+        last_edit = time.monotonic()
+        try:
+            await edit_status(update, context, status_msg, text)
+        except Exception as e:
+            logger.warning(f"Progress update failed: {e}")
+    return edit
+
+async def extract_upload(context, item):
+    # (digest, text) of one uploaded file; a file seen recently (re-upload or forward)
+    # comes from the document cache without being downloaded again
+    digest = document_cache.resolve(item.file_unique_id)
+    content = document_cache.get_text(digest) if digest else None
+    if content is not None:
+        return digest, content
+
+    file = await context.bot.get_file(item.file_id)
+    # Small files stay in memory, large ones are spooled to disk until extracted
+    async with upload_manager.download(file, item.file_ext, item.size) as (source, digest):
+        content = document_cache.get_text(digest)
+        if content is None:
+            content = await extraction_service.extract(source, item.file_ext)
+            if content and len(content) >= 10:
+                document_cache.put_text(digest, content, item.file_unique_id)
+        else:
+            document_cache.put_text(digest, content, item.file_unique_id)
+    return digest, content
+
+async def extract_member(file_ext, data):
+    # ZIP members can be large too; hashlib releases the GIL, so a thread keeps the loop free
+    digest = await asyncio.to_thread(content_hash, data)
+    content = document_cache.get_text(digest)
+    if content is None:
+        content = await extraction_service.extract(data, file_ext)
+        if content and len(content) >= 10:
+            document_cache.put_text(digest, content)
+    return digest, content
+
+async def summarize_document(update, context, status_msg, digest, content, doc_type, name):
+    user_lang = context.user_data.get('language')
+    # Keep the text searchable for follow-up questions in this chat
+    await asyncio.to_thread(document_sessions.add_document, update.effective_chat.id, name, content)
+
+    analysis = document_cache.get_summary(digest, user_lang)
+    if analysis is None:
+        set_request_context(update.effective_chat.id, BULK, queue_notifier(update, context, status_msg))
+        edit_progress = progress_editor(update, context, status_msg)
+
+        async def report_progress(done, total):
+            await edit_progress(f"🔍 Analyzing {name}: part {done}/{total} summarized...", final=done == total)
+
+        analysis, skipped = await document_analyzer.analyze(
+            content, doc_type=doc_type, language=user_lang, progress=report_progress
+        )
+        if skipped and is_cacheable(analysis):
+            # Incomplete: tell the user, and don't cache it so sending the file again retries
+            analysis += PARTIAL_NOTE.format(count=skipped)
+        elif is_cacheable(analysis):
+            document_cache.put_summary(digest, analysis, user_lang)
+    return analysis
+
+async def process_document(update, context, status_msg, item):
+    digest, content = await extract_upload(context, item)
+    if not content or len(content) < 10:
+        await edit_status(update, context, status_msg, "⚠️ Could not extract text. File might be empty/unreadable.")
+        return
+
+    analysis = await summarize_document(update, context, status_msg, digest, content, "Case Document", item.file_name)
+    await edit_status(update, context, status_msg, "✅ Analysis Complete. Summary below:")
+    await safe_send(update.effective_chat.id, analysis + DISCLAIMER, context)
+    await reply(
+        update, context, "💬 You can now ask follow-up questions about this document. Send /closecase to forget it."
+    )
+
+async def process_batch(update, context, status_msg, items):
+    # Case bundle: every file is extracted (a few at a time), repeated pages are dropped
+    # and the whole bundle gets one map-reduce summary instead of one per file
+    edit_progress = progress_editor(update, context, status_msg)
+    skipped = []
+    jobs = []
+    member_bytes = 0
+    for item in items:
+        if item.file_ext != ".zip":
+            jobs.append((item.file_name, functools.partial(extract_upload, context, item)))
+            continue
+        file = await context.bot.get_file(item.file_id)
+        async with upload_manager.download(file, item.file_ext, item.size) as (source, _):
+            try:
+                members, rejected = await asyncio.to_thread(
+                    unpack_zip, source, upload_manager.check, BATCH_MAX_FILES, BATCH_MAX_BYTES
+                )
+            except zipfile.BadZipFile:
+                members, rejected = [], [item.file_name]
+        skipped.extend(rejected)
+        for name, file_ext, data in members:
+            member_bytes += len(data)
+            jobs.append((name, functools.partial(extract_member, file_ext, data)))
+
+    total = len(jobs)
+    done = 0
+    semaphore = asyncio.Semaphore(BATCH_MAX_PARALLEL)
+
+    async def run(name, job):
+        nonlocal done
+        async with semaphore:
+            try:
+                result = await job()
+            except Exception as e:
+                # One unreadable file (corrupt PDF, legacy .doc...) must not sink the bundle
+                logger.warning(f"Batch file {name} skipped: {e!r}")
+                result = None
+        done += 1
+        await edit_progress(f"📚 Reading your files: {done}/{total} done...", final=done == total)
+        return result
+
+    await edit_progress(f"📚 Received {total} files. Reading them...", final=True)
+    # Unpacked ZIP members are held in memory until extracted
+    async with upload_manager.reserve(member_bytes):
+        results = await asyncio.gather(*(run(name, job) for name, job in jobs))
+
+    documents = []
+    digests = []
+    for (name, _), result in zip(jobs, results):
+        if result is None or not result[1] or len(result[1]) < 10:
+            skipped.append(name)
+            continue
+        digests.append(result[0])
+        documents.append((name, result[1]))
+    if not documents:
+        await edit_progress("⚠️ Could not extract text from any of the files.", final=True)
+        return
+
+    # Normalizes and hashes every page: noticeable for large bundles, so not on the event loop
+    content, duplicates = await asyncio.to_thread(merge_documents, documents)
+    digest = content_hash("|".join(digests).encode())
+    document_cache.put_text(digest, content)
+    names = ", ".join(name for name, _ in documents)
+    analysis = await summarize_document(
+        update, context, status_msg, digest, content,
+        f"Case bundle of {len(documents)} documents: {names}", f"case bundle ({len(documents)} files)",
+    )
+
+    done_text = f"✅ Analyzed {len(documents)} documents together"
+    if duplicates:
+        done_text += f" ({duplicates} repeated pages skipped)"
+    done_text += ". Summary below:"
+    if skipped:
+        done_text += f"\n⚠️ Could not read: {', '.join(skipped)}"
+    await edit_progress(done_text, final=True)
+    await safe_send(update.effective_chat.id, analysis + DISCLAIMER, context)
+    await reply(
+        update, context, "💬 You can now ask follow-up questions about these documents. Send /closecase to forget them."
+    )
+
 # Document Handler (File -> Upload Case File Intent)
+@instrumented
 async def handle_document(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     doc = update.message.document or update.message.photo[-1]
     is_image = bool(update.message.photo)
     
     if is_image:
-        file = await context.bot.get_file(update.message.photo[-1].file_id)
         file_name = "image.png"
         file_ext = ".png"
     else:
-        file = await context.bot.get_file(update.message.document.file_id)
         file_name = update.message.document.file_name
         _, file_ext = os.path.splitext(file_name)
 
-    status_msg = await update.message.reply_text(f"🔍 Received {file_name}. Analyzing content...")
-    
+    # Refuse oversized or unsupported files before downloading anything
     try:
-        f_byte_array = await file.download_as_bytearray()
-        content = doc_processor.process_file(f_byte_array, file_ext)
-        
-        if not content or len(content) < 10:
-             await context.bot.edit_message_text(
-                chat_id=update.effective_chat.id, 
-                message_id=status_msg.message_id, 
-                text="⚠️ Could not extract text. File might be empty/unreadable."
-             )
-             return
-        
-        user_lang = context.user_data.get('language')
-        analysis = gemini_client.analyze_document(content, doc_type="Case Document", language=user_lang)
-        
-        await context.bot.edit_message_text(
-            chat_id=update.effective_chat.id, 
-            message_id=status_msg.message_id, 
-            text="✅ Analysis Complete. Summary below:"
-        )
-        await safe_send(update.effective_chat.id, analysis + DISCLAIMER, context)
+        upload_manager.check(file_ext, doc.file_size)
+    except UploadRejected as e:
+        await reply(update, context, f"⚠️ {e}")
+        return
+
+    # Files sent together (an album, or one after another within BATCH_WINDOW) form one
+    # batch handled by the first upload's handler; the others just join it
+    item = BatchItem(doc.file_id, doc.file_unique_id, file_name, file_ext, doc.file_size)
+    # Keyed per sender too, so two group members uploading at once get separate bundles
+    sender = (update.effective_chat.id, update.effective_user.id)
+    batch, leader = batch_collector.join(sender, item)
+    # Let the next file of the batch join while the leader waits out the window
+    release_turn()
+    if not leader:
+        return
+    status_msg = await reply(update, context, f"🔍 Received {file_name}. Analyzing content...")
+    
+    # Uploads from one chat are processed one at a time; later ones wait
+    async with chat_limiter.slot(update.effective_chat.id):
+        try:
+            items = await batch_collector.collect(sender, batch)
+            if len(items) == 1 and item.file_ext != ".zip":
+                await process_document(update, context, status_msg, item)
+            else:
+                await process_batch(update, context, status_msg, items)
             
-    except Exception as e:
-        await handle_error(update, context, status_msg, e)
+        except (ExtractionQueueFull, ExtractionTimeout, UploadBudgetExceeded) as e:
+            await edit_status(update, context, status_msg, f"⚠️ {e} Please try again in a moment.")
+        except UploadRejected as e:
+            await edit_status(update, context, status_msg, f"⚠️ {e}")
+        except Exception as e:
+            await handle_error(update, context, status_msg, e)
 
 # Legacy Commands (kept for direct access)
+@instrumented
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     help_text = "**User Guide**\nUse the buttons or type natural queries like 'Explain IPC 302' or 'Help with my case'."
-    await update.message.reply_markdown(help_text)
+    await reply(update, context, help_text, parse_mode=ParseMode.MARKDOWN)
 
+@instrumented
 async def privacy_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     text = (
         "🔒 *Privacy Policy – Legal Tune Bot*\n\n"
         "We respect your privacy and are committed to protecting your data.\n\n"
         "*1. Data Collection*\n"
-        "We do NOT store personal information\n"
+        "We store only your chosen answer language and the menu option you last picked, linked to your Telegram user ID, so your settings survive restarts\n"
         "Messages are processed only to generate responses\n"
         "Uploaded files are used temporarily for analysis and are not saved\n\n"
         "*2. Use of Information*\n"
@@ -279,7 +639,7 @@ async def privacy_command(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         "This bot uses AI to provide legal information\n"
         "AI responses are informational only, not legal advice\n\n"
         "*4. Data Security*\n"
-        "We do not maintain databases of user conversations\n"
+        "We do not keep your conversations. Answers to common law questions may be cached without any link to who asked\n"
         "Temporary processing is done securely\n\n"
         "*5. Legal Disclaimer*\n"
         "This bot provides legal information, not legal advice.\n"
@@ -287,43 +647,109 @@ async def privacy_command(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         "*6. Policy Updates*\n"
         "This privacy policy may be updated without prior notice."
     )
-    # Use effective_message to handle both Commands and CallbackQueries
-    await update.effective_message.reply_markdown(text)
+    # Also reached from the privacy button, so no update.message here
+    await reply(update, context, text, parse_mode=ParseMode.MARKDOWN)
 
+@instrumented
 async def faq_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     text = "**Legal FAQ** ❓\n\n1. Is this advice? No.\n2. Predictions? No."
-    await update.message.reply_markdown(text)
+    await reply(update, context, text, parse_mode=ParseMode.MARKDOWN)
 
+@instrumented
 async def law_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     if context.args:
-        status_msg = await update.message.reply_text("🔍 Analyzing...")
-        await process_explanation(update, context, " ".join(context.args), status_msg)
+        status_msg = await reply(update, context, "🔍 Analyzing...")
+        with chat_limiter.supersede((update.effective_chat.id, update.effective_user.id)):
+            release_turn()
+            await process_explanation(update, context, " ".join(context.args), status_msg)
     else:
-        await update.message.reply_text("Usage: /law <name>")
+        await reply(update, context, "Usage: /law <name>")
 
+@instrumented
 async def case_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    await update.message.reply_text("Please upload your document.")
+    await reply(update, context, "Please upload your document.")
     context.user_data['active_intent'] = 'intent_upload_case'
 
+@instrumented
+async def closecase_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    if document_sessions.close(update.effective_chat.id):
+        await reply(update, context, "🗑️ Your document has been cleared from memory.")
+    else:
+        await reply(update, context, "No document is open in this chat.")
+
+@instrumented
 async def language_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    await update.message.reply_text("Type your language name now.")
+    await reply(update, context, "Type your language name now.")
     context.user_data['active_intent'] = 'intent_change_lang'
 
 # Global Error Handler
 async def global_error_handler(update: object, context: ContextTypes.DEFAULT_TYPE) -> None:
     logger.error(msg="Exception while handling an update:", exc_info=context.error)
 
-def main() -> None:
-    application = (
+# Drop cached document text once its TTL passes
+async def purge_document_cache(context: ContextTypes.DEFAULT_TYPE) -> None:
+    purged = document_cache.purge_expired() + document_sessions.purge_expired()
+    if purged:
+        logger.info(f"Purged {purged} cached documents")
+
+# Keep memory flat: forget sessions of users who have gone quiet (they reload lazily)
+async def evict_idle_sessions(context: ContextTypes.DEFAULT_TYPE) -> None:
+    evicted = await context.application.persistence.evict_idle(context.application, SESSION_IDLE_TTL)
+    if evicted:
+        logger.info(f"Evicted {evicted} idle sessions from memory")
+
+# Spin up extraction workers before the first update arrives
+async def on_startup(application: Application) -> None:
+    global metrics_server, response_cache, statute_index
+    # Connection pools, worker processes, the cache and the statute index are created here,
+    # not at import, so a worker imports this module quickly and pays for them once the
+    # application actually starts
+    response_cache = ResponseCache(RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL, RESPONSE_CACHE_DB or None)
+    gemini_client.cache = response_cache
+    statute_index = StatuteIndex(STATUTE_INDEX_PATH)
+    gemini_client.start()
+    extraction_service.start()
+    if metrics_port:
+        metrics_server = await start_metrics_server(METRICS_HOST, metrics_port)
+
+# Release pooled Gemini connections on shutdown
+async def on_shutdown(application: Application) -> None:
+    await gemini_client.aclose()
+    if metrics_server is not None:
+        metrics_server.close()
+    await gemini_scheduler.close()
+    if response_cache is not None:
+        logger.info(f"Response cache stats: {response_cache.stats()}")
+        response_cache.close()
+    if statute_index is not None:
+        statute_index.close()
+    document_cache.clear()
+    document_sessions.clear()
+    extraction_service.shutdown()
+
+def build_application(persistence=None, request=None) -> Application:
+    # Shared by polling mode (main), the webhook workers (app/webhook.py) and the load test,
+    # which passes its own Bot API request backend (benchmarks/fake_telegram.py)
+    check_credentials()
+    builder = (
         Application.builder()
         .token(TELEGRAM_BOT_TOKEN)
-        .read_timeout(30)
-        .write_timeout(30)
-        .connect_timeout(30)
-        .build()
+        .concurrent_updates(ChatUpdateProcessor())
+        .post_init(on_startup)
+        .post_shutdown(on_shutdown)
     )
+    if request is None:
+        builder = builder.read_timeout(30).write_timeout(30).connect_timeout(30)
+    else:
+        builder = builder.request(request).get_updates_request(request)
+    if persistence is not None:
+        builder = builder.persistence(persistence)
+    application = builder.build()
+    if persistence is not None:
+        application.job_queue.run_repeating(evict_idle_sessions, interval=300)
 
     application.add_error_handler(global_error_handler)
+    application.job_queue.run_repeating(purge_document_cache, interval=60)
 
     # Commands
     application.add_handler(CommandHandler("start", start))
@@ -333,16 +759,22 @@ def main() -> None:
     application.add_handler(CommandHandler("law", law_command))
     application.add_handler(CommandHandler("case", case_command))
     application.add_handler(CommandHandler("language", language_command))
+    application.add_handler(CommandHandler("closecase", closecase_command))
     
     application.add_handler(CallbackQueryHandler(button_handler))
     
     # Handlers
     application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_text))
     application.add_handler(MessageHandler(filters.Document.ALL | filters.PHOTO, handle_document))
+    return application
+
+def main() -> None:
+    application = build_application(SQLitePersistence(SESSION_DB, SESSION_FLUSH_INTERVAL))
 
+    # Keep updates that queued up while the bot was restarting
     application.run_polling(
         allowed_updates=Update.ALL_TYPES,
-        drop_pending_updates=True
+        drop_pending_updates=False
     )
 
 if __name__ == "__main__":
@@ -0,0 +1,291 @@
+import asyncio
+import hashlib
+import logging
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_query(query: str) -> str:
+    # "  IPC 420? " and "ipc 420" should share one cache entry
+    query = re.sub(r"\s+", " ", query.lower()).strip()
+    return query.rstrip("?!. ")
+
+
+def make_key(query: str, language: str = None, template: str = "default") -> str:
+    raw = f"{template}|{(language or '').strip().lower()}|{normalize_query(query)}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class MemoryCacheBackend:
+    # LRU ordered dict with per-entry expiry
+    def __init__(self, max_size: int = 1000):
+        self.max_size = max_size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires < time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str, ttl: float) -> None:
+        with self._lock:
+            self._data[key] = (value, time.time() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class SQLiteCacheBackend:
+    # On-disk backend so cached answers survive restarts. Calls block, so ResponseCache
+    # runs them in a thread. Access times of hits are buffered and written with the next
+    # set; expired and least recently used rows are pruned every PRUNE_EVERY writes.
+    PRUNE_EVERY = 100
+
+    def __init__(self, path: str, max_size: int = 10000):
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._touched = {}
+        self._writes = 0
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+        self._conn.commit()
+
+    def get(self, key: str):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, expires FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None or row[1] < now:
+                # Expired rows are left for the next prune
+                return None
+            self._touched[key] = now
+            return row[0]
+
+    def set(self, key: str, value: str, ttl: float) -> None:
+        now = time.time()
+        with self._lock:
+            self._touched.pop(key, None)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, expires, accessed) VALUES (?, ?, ?, ?)",
+                (key, value, now + ttl, now),
+            )
+            if self._touched:
+                self._conn.executemany(
+                    "UPDATE responses SET accessed = ? WHERE key = ?",
+                    [(accessed, k) for k, accessed in self._touched.items()],
+                )
+                self._touched.clear()
+            self._writes += 1
+            if self._writes >= self.PRUNE_EVERY:
+                self._writes = 0
+                self._prune(now)
+            self._conn.commit()
+
+    def _prune(self, now: float) -> None:
+        self._conn.execute("DELETE FROM responses WHERE expires < ?", (now,))
+        excess = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0] - self.max_size
+        if excess > 0:
+            self._conn.execute(
+                "DELETE FROM responses WHERE key IN "
+                "(SELECT key FROM responses ORDER BY accessed LIMIT ?)",
+                (excess,),
+            )
+
+    def clear(self) -> None:
+        with self._lock:
+            self._touched.clear()
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._touched:
+                self._conn.executemany(
+                    "UPDATE responses SET accessed = ? WHERE key = ?",
+                    [(accessed, k) for k, accessed in self._touched.items()],
+                )
+                self._conn.commit()
+            self._conn.close()
+
+
+class ResponseCache:
+    # Two tiers: in-process LRU in front of an optional SQLite store. The SQLite tier is
+    # only touched from a worker thread so disk I/O never stalls the event loop.
+    def __init__(self, max_size: int = 1000, ttl: float = 86400, db_path: str = None):
+        self.ttl = ttl
+        self.memory = MemoryCacheBackend(max_size)
+        self.disk = SQLiteCacheBackend(db_path, max_size * 10) if db_path else None
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, query: str, language: str = None, template: str = "default"):
+        key = make_key(query, language, template)
+        value = self.memory.get(key)
+        if value is None and self.disk is not None:
+            value = await asyncio.to_thread(self.disk.get, key)
+            if value is not None:
+                self.memory.set(key, value, self.ttl)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    async def set(self, query: str, value: str, language: str = None, template: str = "default") -> None:
+        key = make_key(query, language, template)
+        self.memory.set(key, value, self.ttl)
+        if self.disk is not None:
+            await asyncio.to_thread(self.disk.set, key, value, self.ttl)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "size": len(self.memory),
+        }
+
+    def close(self) -> None:
+        if self.disk is not None:
+            self.disk.close()
+
+
+def content_hash(source) -> str:
+    # sha256 of file bytes, or of a spooled upload read from disk in 1 MB blocks
+    if isinstance(source, (bytes, bytearray)):
+        return hashlib.sha256(source).hexdigest()
+    digest = hashlib.sha256()
+    with open(source, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class DocumentEntry:
+    __slots__ = ("text", "summaries", "expires")
+
+    def __init__(self, text: str, expires: float):
+        self.text = text
+        self.summaries = {}
+        self.expires = expires
+
+    def size(self) -> int:
+        return len(self.text.encode("utf-8")) + sum(len(s.encode("utf-8")) for s in self.summaries.values())
+
+
+class DocumentCache:
+    # Memory-only on purpose: uploaded files are "not saved" per the privacy policy,
+    # so entries live for a short TTL, are bounded by total bytes and never touch disk.
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, ttl: float = 1800):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._aliases = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def resolve(self, file_unique_id: str):
+        # Telegram's file_unique_id lets a repeat upload skip the download entirely
+        with self._lock:
+            return self._aliases.get(file_unique_id)
+
+    def get_text(self, digest: str):
+        with self._lock:
+            entry = self._live_entry(digest)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry.text
+
+    def get_summary(self, digest: str, language: str = None):
+        with self._lock:
+            entry = self._live_entry(digest)
+            if entry is None:
+                return None
+            return entry.summaries.get((language or "").lower())
+
+    def put_text(self, digest: str, text: str, file_unique_id: str = None) -> None:
+        with self._lock:
+            if file_unique_id:
+                self._aliases[file_unique_id] = digest
+            entry = self._entries.get(digest)
+            if entry is None:
+                entry = DocumentEntry(text, time.time() + self.ttl)
+                self._entries[digest] = entry
+                self._bytes += entry.size()
+            self._entries.move_to_end(digest)
+            self._evict()
+
+    def put_summary(self, digest: str, summary: str, language: str = None) -> None:
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is None:
+                return
+            self._bytes -= entry.size()
+            entry.summaries[(language or "").lower()] = summary
+            self._bytes += entry.size()
+            self._evict()
+
+    def purge_expired(self) -> int:
+        now = time.time()
+        with self._lock:
+            expired = [d for d, e in self._entries.items() if e.expires < now]
+            for digest in expired:
+                self._remove(digest)
+            return len(expired)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._aliases.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries), "bytes": self._bytes}
+
+    def _live_entry(self, digest: str):
+        entry = self._entries.get(digest)
+        if entry is None:
+            return None
+        if entry.expires < time.time():
+            self._remove(digest)
+            return None
+        self._entries.move_to_end(digest)
+        return entry
+
+    def _remove(self, digest: str) -> None:
+        entry = self._entries.pop(digest, None)
+        if entry is not None:
+            self._bytes -= entry.size()
+        self._aliases = {k: v for k, v in self._aliases.items() if v != digest}
+
+    def _evict(self) -> None:
+        while self._bytes > self.max_bytes and self._entries:
+            self._remove(next(iter(self._entries)))
@@ -0,0 +1,167 @@
+import asyncio
+import contextvars
+import logging
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+
+from telegram.ext import BaseUpdateProcessor
+
+logger = logging.getLogger(__name__)
+
+
+class ChatLimiter:
+    # In-flight limits. supersede() is for questions, keyed per sender ((chat_id, user_id), so
+    # group members don't cancel each other): a newer message cancels the oldest one still
+    # running. slot() is for documents, per chat: extra uploads wait their turn.
+    def __init__(self, max_in_flight: int = 1, max_documents: int = 1):
+        self.max_in_flight = max_in_flight
+        self.max_documents = max_documents
+        self._tasks = {}
+        self._slots = {}
+        self.superseded = 0
+
+    @contextmanager
+    def supersede(self, key):
+        task = asyncio.current_task()
+        tasks = self._tasks.setdefault(key, deque())
+        tasks.append(task)
+        while len(tasks) > self.max_in_flight:
+            old = tasks.popleft()
+            old.cancel()
+            self.superseded += 1
+            logger.info(f"Cancelled superseded request from {key}")
+        try:
+            yield
+        finally:
+            if task in tasks:
+                tasks.remove(task)
+            if not tasks and self._tasks.get(key) is tasks:
+                del self._tasks[key]
+
+    @asynccontextmanager
+    async def slot(self, chat_id):
+        entry = self._slots.get(chat_id)
+        if entry is None:
+            entry = self._slots[chat_id] = [asyncio.Semaphore(self.max_documents), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._slots[chat_id]
+
+    def in_flight(self) -> int:
+        return sum(len(tasks) for tasks in self._tasks.values())
+
+
+class ChatTurn:
+    # One update's hold on its chat's lock; released once, by release_turn() or at the end
+    __slots__ = ("lock", "released")
+
+    def __init__(self, lock: asyncio.Lock):
+        self.lock = lock
+        self.released = False
+
+    def release(self) -> None:
+        if not self.released:
+            self.released = True
+            self.lock.release()
+
+
+_turn = contextvars.ContextVar("chat_turn", default=None)
+
+
+def release_turn() -> None:
+    # Called by a handler once the order-sensitive part is done (reading user_data,
+    # registering for supersede, joining a batch); the chat's next update may then start
+    turn = _turn.get()
+    if turn is not None:
+        turn.release()
+
+
+class ChatUpdateProcessor(BaseUpdateProcessor):
+    # Updates from different chats run concurrently; updates from one chat run in
+    # arrival order, each starting once the previous one finished or called release_turn()
+    __slots__ = ("_chats",)
+
+    def __init__(self, max_concurrent_updates: int = 256):
+        super().__init__(max_concurrent_updates)
+        self._chats = {}
+
+    async def process_update(self, update, coroutine) -> None:
+        # The chat's turn is awaited before the global slot is taken, so a chat with a long
+        # backlog queues on its own lock instead of filling max_concurrent_updates
+        chat = getattr(update, "effective_chat", None)
+        if chat is None:
+            await super().process_update(update, coroutine)
+            return
+        entry = self._chats.get(chat.id)
+        if entry is None:
+            entry = self._chats[chat.id] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            await entry[0].acquire()
+            turn = ChatTurn(entry[0])
+            token = _turn.set(turn)
+            try:
+                await super().process_update(update, coroutine)
+            finally:
+                _turn.reset(token)
+                turn.release()
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._chats[chat.id]
+
+    async def do_process_update(self, update, coroutine) -> None:
+        await coroutine
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+
+class RequestCoalescer:
+    # Identical concurrent prompts share one upstream call. The call runs in its own task,
+    # so a waiter being cancelled (e.g. superseded) does not cancel it for the others.
+    def __init__(self):
+        self._inflight = {}
+        self.coalesced = 0
+
+    async def run(self, key: str, factory):
+        leader = self._inflight.get(key)
+        if leader is not None:
+            self.coalesced += 1
+            result = await asyncio.shield(leader)
+            if result is not None:
+                return result
+
+        task = asyncio.ensure_future(factory())
+        self._inflight[key] = task
+        task.add_done_callback(lambda done: self._inflight.pop(key) if self._inflight.get(key) is done else None)
+        return await asyncio.shield(task)
+
+    # Streaming variant: the leader claims the key and publishes its full text when done;
+    # followers await it. A None result means the leader did not finish and the follower
+    # should make its own call.
+    def pending(self, key: str):
+        return self._inflight.get(key)
+
+    def claim(self, key: str):
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        return future
+
+    def release(self, key: str, future, result: str = None) -> None:
+        if not future.done():
+            future.set_result(result)
+        if self._inflight.get(key) is future:
+            del self._inflight[key]
+
+    async def wait(self, future):
+        self.coalesced += 1
+        return await asyncio.shield(future)
@@ -1,41 +1,136 @@
 
 import io
-import pytesseract
-from PIL import Image
-import pdfplumber
-from docx import Document
+import logging
+import time
+
+# pdfplumber, python-docx, Pillow and pytesseract are imported by the methods that need
+# them: the bot process only imports this module for PAGE_BREAK/open_source, and an
+# extraction worker only pays for the formats it actually sees
+
+logger = logging.getLogger(__name__)
+
+# Separates pages in extracted PDF text so later stages can split on page boundaries
+PAGE_BREAK = "\f"
+
+
+def open_source(source):
+    # Uploads arrive either as bytes or as the path of a spooled temp file; the libraries
+    # below accept a path directly and read it lazily instead of holding it all in memory
+    if isinstance(source, (bytes, bytearray)):
+        return io.BytesIO(source)
+    return source
 
 class DocumentProcessor:
-    def extract_text_from_pdf(self, file_bytes: bytes) -> str:
-        text = ""
-        with pdfplumber.open(io.BytesIO(file_bytes)) as pdf:
-            for page in pdf.pages:
-                text += page.extract_text() or ""
-        return text
+    def __init__(self, ocr_dpi: int = 200, ocr_max_dimension: int = 3000, ocr_threshold: int = 160):
+        # 200 DPI is enough for court-document fonts; higher mostly slows Tesseract down
+        self.ocr_dpi = ocr_dpi
+        self.ocr_max_dimension = ocr_max_dimension
+        self.ocr_threshold = ocr_threshold
+
+    def count_pdf_pages(self, source) -> int:
+        import pdfplumber
+        with pdfplumber.open(open_source(source)) as pdf:
+            return len(pdf.pages)
+
+    def iter_pdf_pages(self, source, start: int = 0, end: int = None, ocr: bool = True, ocr_deadline: float = None):
+        # Yields (page_number, text) one page at a time instead of building one big string.
+        # Image-only (scanned) pages are OCR'd when ocr=True, otherwise yielded as None so
+        # the caller can OCR them elsewhere.
+        import pdfplumber
+        with pdfplumber.open(open_source(source)) as pdf:
+            for number, page in enumerate(pdf.pages[start:end], start=start):
+                text = page.extract_text() or ""
+                if self.is_image_only(page, text):
+                    text = self.ocr_pdf_page_obj(page, ocr_deadline) if ocr else None
+                yield number, text
+                # pdfplumber caches parsed layout objects per page; drop them as we go
+                page.flush_cache()
+
+    def extract_pdf_pages(self, source, start: int = 0, end: int = None, max_chars: int = None,
+                          ocr: bool = True, ocr_deadline: float = None) -> list:
+        pages = []
+        total = 0
+        for _, text in self.iter_pdf_pages(source, start, end, ocr=ocr, ocr_deadline=ocr_deadline):
+            pages.append(text)
+            total += len(text or "")
+            if max_chars is not None and total >= max_chars:
+                break
+        return pages
 
-    def extract_text_from_docx(self, file_bytes: bytes) -> str:
-        doc = Document(io.BytesIO(file_bytes))
+    def extract_text_from_pdf(self, source, max_chars: int = None, ocr_deadline: float = None) -> str:
+        return PAGE_BREAK.join(self.extract_pdf_pages(source, max_chars=max_chars, ocr_deadline=ocr_deadline))
+
+    def is_image_only(self, page, text: str) -> bool:
+        return not text.strip() and bool(page.images)
+
+    def ocr_pdf_page(self, source, page_number: int, ocr_deadline: float = None) -> str:
+        import pdfplumber
+        with pdfplumber.open(open_source(source)) as pdf:
+            return self.ocr_pdf_page_obj(pdf.pages[page_number], ocr_deadline)
+
+    def ocr_pdf_page_obj(self, page, ocr_deadline: float = None) -> str:
+        import pytesseract
+        timeout = 0
+        if ocr_deadline is not None:
+            timeout = ocr_deadline - time.time()
+            if timeout <= 0:
+                logger.warning(f"OCR time budget exhausted, skipping page {page.page_number}")
+                return ""
+        image = page.to_image(resolution=self.ocr_dpi).original
+        try:
+            return pytesseract.image_to_string(self.preprocess_image(image), timeout=timeout)
+        except Exception as e:
+            logger.error(f"OCR failed on page {page.page_number}: {e}")
+            return ""
+
+    def preprocess_image(self, image: "Image.Image") -> "Image.Image":
+        # Cheap cleanup before Tesseract: respect phone EXIF rotation, grayscale, shrink huge
+        # photos, stretch contrast and binarize
+        from PIL import ImageOps
+        image = ImageOps.exif_transpose(image)
+        image = image.convert("L")
+        if max(image.size) > self.ocr_max_dimension:
+            image.thumbnail((self.ocr_max_dimension, self.ocr_max_dimension))
+        image = ImageOps.autocontrast(image)
+        threshold = self.ocr_threshold
+        return image.point(lambda p: 255 if p > threshold else 0, mode="1")
+
+    def extract_text_from_docx(self, source) -> str:
+        from docx import Document
+        doc = Document(open_source(source))
         text = "\n".join([para.text for para in doc.paragraphs])
         return text
 
-    def extract_text_from_image(self, file_bytes: bytes) -> str:
-        image = Image.open(io.BytesIO(file_bytes))
+    def extract_text_from_image(self, source) -> str:
+        import pytesseract
+        from PIL import Image
+        image = Image.open(open_source(source))
+        # JPEGs can be decoded straight to grayscale at a reduced scale, so a 20-megapixel
+        # phone photo never exists in memory at full size
+        image.draft("L", (self.ocr_max_dimension, self.ocr_max_dimension))
         # Note: Tesseract binary must be in PATH or configured specifically
         try:
-            text = pytesseract.image_to_string(image)
+            text = pytesseract.image_to_string(self.preprocess_image(image))
         except Exception as e:
             return f"Error using Tesseract OCR: {str(e)}. Ensure Tesseract is installed."
         return text
 
-    def process_file(self, file_bytes: bytes, file_ext: str) -> str:
+    def extract_text_from_txt(self, source, max_chars: int = None) -> str:
+        if isinstance(source, (bytes, bytearray)):
+            return source.decode('utf-8', errors='ignore')[:max_chars]
+        with open(source, encoding='utf-8', errors='ignore') as f:
+            return f.read(max_chars if max_chars else -1)
+
+    def process_file(self, source, file_ext: str, max_chars: int = None, ocr_deadline: float = None) -> str:
+        # source: file bytes, or the path of an upload spooled to disk
         file_ext = file_ext.lower()
         if file_ext == '.pdf':
-            return self.extract_text_from_pdf(file_bytes)
+            return self.extract_text_from_pdf(source, max_chars=max_chars, ocr_deadline=ocr_deadline)
         elif file_ext in ['.docx', '.doc']:
-            return self.extract_text_from_docx(file_bytes)
+            return self.extract_text_from_docx(source)
         elif file_ext in ['.jpg', '.jpeg', '.png']:
-            return self.extract_text_from_image(file_bytes)
+            return self.extract_text_from_image(source)
         elif file_ext == '.txt':
-            return file_bytes.decode('utf-8')
+            return self.extract_text_from_txt(source, max_chars)
         else:
             return "Unsupported file format."
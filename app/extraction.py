@@ -0,0 +1,163 @@
+import asyncio
+import logging
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from app.document_processor import DocumentProcessor, PAGE_BREAK
+from app.metrics import span
+from app.prompts import strip_boilerplate
+
+logger = logging.getLogger(__name__)
+
+
+class ExtractionQueueFull(Exception):
+    pass
+
+
+class ExtractionTimeout(Exception):
+    pass
+
+
+# These run inside worker processes, which each build one processor at start-up
+_processor = None
+
+
+def _init_worker(processor_options: dict) -> None:
+    global _processor
+    _processor = DocumentProcessor(**processor_options)
+
+
+def _run_extraction(source, file_ext: str, max_chars: int = None, ocr_deadline: float = None) -> str:
+    text = _processor.process_file(source, file_ext, max_chars=max_chars, ocr_deadline=ocr_deadline)
+    # Running headers, page numbers and whitespace runs would only cost prompt tokens
+    return strip_boilerplate(text) if text else text
+
+
+def _count_pdf_pages(source) -> int:
+    return _processor.count_pdf_pages(source)
+
+
+def _extract_pdf_range(source, start: int, end: int, max_chars: int = None) -> list:
+    # Text layer only; scanned pages come back as None and are OCR'd page by page
+    return _processor.extract_pdf_pages(source, start, end, max_chars=max_chars, ocr=False)
+
+
+def _ocr_pdf_page(source, page_number: int, ocr_deadline: float = None) -> str:
+    return _processor.ocr_pdf_page(source, page_number, ocr_deadline)
+
+
+class ExtractionService:
+    # Bounded process pool for CPU-heavy PDF/DOCX/OCR work so the event loop stays free.
+    # max_pending caps running + queued jobs; beyond that submit() fails fast.
+    def __init__(self, workers: int = 2, max_pending: int = 8, timeout: float = 120,
+                 max_chars: int = None, pages_per_job: int = 10, ocr_time_budget: float = 60,
+                 max_pages: int = None, processor_options: dict = None):
+        self.workers = workers
+        self.timeout = timeout
+        self.max_chars = max_chars
+        self.pages_per_job = pages_per_job
+        self.ocr_time_budget = ocr_time_budget
+        self.max_pages = max_pages
+        self.processor_options = processor_options or {}
+        self.in_flight = 0
+        self._slots = asyncio.Semaphore(max_pending)
+        self._executor = None
+
+    def start(self) -> None:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                initializer=_init_worker,
+                initargs=(self.processor_options,),
+            )
+
+    def share(self, workers: int) -> None:
+        # Webhook workers each run a pool on the same machine; split the CPUs between them
+        self.workers = max(1, self.workers // workers)
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    @property
+    def queue_full(self) -> bool:
+        return self._slots.locked()
+
+
+    async def extract(self, source, file_ext: str, timeout: float = None) -> str:
+        # source: the file's bytes, or the path of a spooled upload. Paths keep large files
+        # from being pickled to a worker once per page range.
+        if self.queue_full:
+            raise ExtractionQueueFull("Too many documents are being processed right now.")
+        self.start()
+
+        async with self._slots:
+            self.in_flight += 1
+            ocr_deadline = time.time() + self.ocr_time_budget
+            if file_ext.lower() == '.pdf':
+                job = self._extract_pdf(source, ocr_deadline)
+            else:
+                job = self._submit(_run_extraction, source, file_ext, self.max_chars, ocr_deadline)
+            try:
+                # Timed here rather than inside DocumentProcessor: it runs in worker processes
+                with span("extract", format=file_ext.lower().lstrip(".")):
+                    return await asyncio.wait_for(job, timeout or self.timeout)
+            except asyncio.TimeoutError:
+                # wait_for cancels the future; a job already running in a worker finishes
+                # in the background but its result is discarded
+                logger.warning(f"Extraction of {file_ext} file timed out after {timeout or self.timeout}s")
+                raise ExtractionTimeout("Document took too long to process.")
+            finally:
+                self.in_flight -= 1
+
+    def _submit(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        return loop.run_in_executor(self._executor, fn, *args)
+
+    def _budget_reached(self, pages: list) -> bool:
+        return self.max_chars is not None and sum(len(p or "") for p in pages) >= self.max_chars
+
+    async def _extract_pdf(self, source, ocr_deadline: float) -> str:
+        page_count = await self._submit(_count_pdf_pages, source)
+        if self.max_pages is not None and page_count > self.max_pages:
+            logger.warning(f"PDF has {page_count} pages, extracting the first {self.max_pages}")
+            page_count = self.max_pages
+
+        # Spread page ranges over the workers one wave at a time, in page order, and stop
+        # scheduling new ranges once the character budget is met
+        ranges = [(start, min(start + self.pages_per_job, page_count))
+                  for start in range(0, page_count, self.pages_per_job)]
+        pages = []
+        for wave_start in range(0, len(ranges), self.workers):
+            wave = ranges[wave_start:wave_start + self.workers]
+            results = await asyncio.gather(*(
+                self._submit(_extract_pdf_range, source, start, end, self.max_chars)
+                for start, end in wave
+            ))
+            for chunk in results:
+                pages.extend(chunk)
+            if self._budget_reached(pages):
+                break
+
+        # Scanned pages: OCR them in parallel, in page order, within the document time budget
+        scanned = [number for number, text in enumerate(pages) if text is None]
+        for wave_start in range(0, len(scanned), self.workers):
+            if self._budget_reached(pages) or time.time() >= ocr_deadline:
+                break
+            wave = scanned[wave_start:wave_start + self.workers]
+            results = await asyncio.gather(*(
+                self._submit(_ocr_pdf_page, source, number, ocr_deadline) for number in wave
+            ))
+            for number, text in zip(wave, results):
+                pages[number] = text
+
+        pages = [text or "" for text in pages]
+        text = PAGE_BREAK.join(pages)
+        if self.max_chars is not None and len(text) > self.max_chars:
+            # Trim at the last page boundary that fits, keeping page breaks intact
+            cut = text.rfind(PAGE_BREAK, 0, self.max_chars)
+            text = text[:cut] if cut > 0 else text[:self.max_chars]
+        # Boilerplate needs every page to spot running headers, so it is stripped here, in
+        # one more worker job rather than on the event loop
+        return await self._submit(strip_boilerplate, text) if text.strip() else text
@@ -1,35 +1,183 @@
-import requests
+import asyncio
+import random
+import time
+import httpx
 import json
 import logging
-from config import GEMINI_API_KEY
+from config import (
+    GEMINI_API_KEY, GEMINI_MAX_CONCURRENCY, GEMINI_MAX_CONNECTIONS,
+    PROMPT_BUDGET_DOCUMENT, PROMPT_BUDGET_QUESTION, PROMPT_BUDGET_REFERENCES,
+)
+from app.cache import ResponseCache, make_key
+from app.concurrency import RequestCoalescer
+from app.metrics import (
+    gemini_seconds, gemini_first_token_seconds, gemini_retries, gemini_rate_limited, gemini_errors,
+    gemini_tokens, log_event,
+)
+from app.prompts import fit_to_budget, fit_sections, payload_tokens
+from app.scheduler import GeminiScheduler
 
 logger = logging.getLogger(__name__)
 
-class GeminiClient:
-    def __init__(self):
-        self.api_key = GEMINI_API_KEY
-        # STRICT REQUIREMENT: v1 endpoint, gemini-2.5-flash model (Verified Available)
-        self.url = "https://generativelanguage.googleapis.com/v1/models/gemini-2.5-flash:generateContent"
-        
-        self.system_instructions = """You are a Legal Information Assistant.
+# STRICT REQUIREMENT: v1 endpoint, gemini-2.5-flash model (Verified Available)
+GEMINI_URL = "https://generativelanguage.googleapis.com/v1/models/gemini-2.5-flash:generateContent"
+GEMINI_STREAM_URL = "https://generativelanguage.googleapis.com/v1/models/gemini-2.5-flash:streamGenerateContent"
+
+SYSTEM_INSTRUCTIONS = """You are a Legal Information Assistant.
 You explain laws, rights, and legal procedures in simple language.
 You do NOT provide legal advice, predictions, or guarantees.
 You assist users by explaining concepts, risks, options, and procedures.
 You always include a disclaimer for case-related questions.
 You adapt responses to the user’s language and education level."""
 
+UNAVAILABLE_MESSAGE = "⚠️ The AI service is temporarily unavailable. Please try again later."
+
+
+class StreamInterrupted(Exception):
+    # The stream broke after some text was already delivered; that text is incomplete
+    pass
+
+
+SUMMARY_FORMAT = """Strictly follow this structure and keep the total response under 3500 characters:
+
+1. **Case Type/Nature**: What kind of document/case is this?
+2. **Key Facts**: The most important events or details.
+3. **Relevant Laws**: Laws or acts mentioned or applicable.
+4. **Current Status**: What is the current state of the matter?
+5. **Key Evidence/Points**: Main points supporting the case.
+
+Do NOT provide a full detailed analysis yet. Just the critical summary.
+Disclaimer: State clearly that this is an analysis for informational purposes only."""
+
+
+def build_payload(prompt_text: str, language: str = None) -> dict:
+    # System instructions and the reply language go in Gemini's systemInstruction field,
+    # so the user turn carries only the request itself
+    system = SYSTEM_INSTRUCTIONS
+    if language:
+        system += f"\nIMPORTANT: Provide the response in {language} language."
+    return {
+        "systemInstruction": {"parts": [{"text": system}]},
+        "contents": [
+            {
+                "role": "user",
+                "parts": [{"text": prompt_text}]
+            }
+        ]
+    }
+
+
+def record_usage(data: dict, intent: str) -> None:
+    # Token counts reported by the API, per intent, for cost tracking
+    usage = data.get("usageMetadata")
+    if not usage:
+        return
+    prompt = usage.get("promptTokenCount", 0)
+    output = usage.get("candidatesTokenCount", 0)
+    gemini_tokens.inc(prompt, intent=intent, kind="prompt")
+    gemini_tokens.inc(output, intent=intent, kind="output")
+    log_event("gemini_usage", intent=intent, prompt_tokens=prompt, output_tokens=output,
+              total_tokens=usage.get("totalTokenCount", prompt + output))
+
+
+def extract_text(data: dict) -> str:
+    text = extract_delta(data)
+    return text if text else "Error: Empty response from AI."
+
+
+def extract_delta(data: dict) -> str:
+    if "candidates" in data and len(data["candidates"]) > 0:
+        content = data["candidates"][0].get("content", {})
+        parts = content.get("parts", [])
+        if parts:
+            return parts[0].get("text", "")
+    return ""
+
+
+def is_cacheable(response: str) -> bool:
+    return bool(response) and response != UNAVAILABLE_MESSAGE and not response.startswith("Error:")
+
+
+def explanation_prompt(query: str, references: list = None) -> str:
+    prompt = f"User Query: {query}\n\nExplain this law or legal concept in simple terms."
+    if references:
+        # Ground the answer in the local statute index, best matches first
+        sources = "\n\n".join(fit_sections(references, PROMPT_BUDGET_REFERENCES))
+        prompt += f"\n\nBase your answer on these provisions:\n\n{sources}"
+    return prompt
+
+
+def document_prompt(text: str, doc_type: str) -> str:
+    return f"""I have a document (Type: {doc_type}) with the following content:
+
+{fit_to_budget(text, PROMPT_BUDGET_DOCUMENT)}
+
+Please provide a **concise legal summary** of this document.
+{SUMMARY_FORMAT}
+"""
+
+
+def document_question_prompt(question: str, excerpts: list) -> str:
+    sources = "\n\n".join(fit_sections(
+        [f"--- Excerpt from {name} ---\n{chunk}" for name, chunk in excerpts], PROMPT_BUDGET_QUESTION
+    ))
+    return f"""The user previously uploaded a case document. These are the excerpts most relevant to their question:
+
+{sources}
+
+User Question: "{question}"
+
+Answer using only the excerpts above and explain it in simple terms. If the excerpts do not
+contain the answer, say so and suggest what to look for in the full document.
+"""
+
+
+def chunk_summary_prompt(text: str, doc_type: str, index: int, total: int) -> str:
+    return f"""This is part {index} of {total} of a document (Type: {doc_type}):
+
+{text}
+
+Summarize this part in under 1500 characters. Keep names, dates, sections/acts cited,
+orders passed and evidence mentioned. Do not add information that is not in the text.
+"""
+
+
+def merge_prompt(summaries: list, doc_type: str) -> str:
+    parts = "\n\n".join(f"--- Part {i} ---\n{summary}" for i, summary in enumerate(summaries, start=1))
+    return f"""Below are summaries of consecutive parts of one document (Type: {doc_type}):
+
+{parts}
+
+Combine them into a **concise legal summary** of the whole document.
+{SUMMARY_FORMAT}
+"""
+
+
+def case_assistance_prompt(query: str) -> str:
+    return f"""User Request for Case Assistance: "{query}"
+
+Please act as a Legal Strategy Assistant.
+Provide:
+1. Evaluation of the situation.
+2. Strategic suggestions to win or strengthen the case.
+3. Relevant laws that support this position.
+4. Evidence that should be gathered.
+
+Keep it practical and actionable.
+"""
+
+
+class GeminiClient:
+    def __init__(self):
+        self.api_key = GEMINI_API_KEY
+        self.url = GEMINI_URL
+        self.system_instructions = SYSTEM_INSTRUCTIONS
+
     def _call_gemini(self, prompt_text: str, language: str = None) -> str:
-        # Construct payload with system instructions prepended to user prompt
-        lang_instruction = f"\n\nIMPORTANT: Provide the response in {language} language." if language else ""
-        full_text = f"{self.system_instructions}\n\n{prompt_text}{lang_instruction}"
-        
-        payload = {
-            "contents": [
-                {
-                    "parts": [{"text": full_text}]
-                }
-            ]
-        }
+        # Blocking legacy client; the bot itself never loads requests
+        import requests
+
+        payload = build_payload(prompt_text, language)
         
         # Retry Logic: backoff factor for 429 server errors
         retries = 3
@@ -54,18 +202,10 @@ You adapt responses to the user’s language and education level."""
                         continue
                     else:
                         # Final failure after retries
-                        return "⚠️ The AI service is temporarily unavailable. Please try again later."
+                        return UNAVAILABLE_MESSAGE
                 
                 response.raise_for_status()
-                data = response.json()
-                
-                if "candidates" in data and len(data["candidates"]) > 0:
-                    content = data["candidates"][0].get("content", {})
-                    parts = content.get("parts", [])
-                    if parts:
-                        return parts[0].get("text", "")
-                
-                return "Error: Empty response from AI."
+                return extract_text(response.json())
                 
             except requests.exceptions.RequestException as e:
                 logger.error(f"Gemini API Request Error: {e}")
@@ -79,32 +219,230 @@ You adapt responses to the user’s language and education level."""
                         backoff *= 2
                         continue
                      else:
-                        return "⚠️ The AI service is temporarily unavailable. Please try again later."
+                        return UNAVAILABLE_MESSAGE
 
                 # For any other error, return generic message instead of raw JSON
-                return "⚠️ The AI service is temporarily unavailable. Please try again later."
+                return UNAVAILABLE_MESSAGE
         
-        return "⚠️ The AI service is temporarily unavailable. Please try again later."
+        return UNAVAILABLE_MESSAGE
 
     def get_legal_explanation(self, query: str, language: str = None) -> str:
-        prompt = f"User Query: {query}\n\nExplain this law or legal concept in simple terms."
-        return self._call_gemini(prompt, language=language)
+        return self._call_gemini(explanation_prompt(query), language=language)
 
     def analyze_document(self, text: str, doc_type: str = "generic", language: str = None) -> str:
-        prompt = f"""I have a document (Type: {doc_type}) with the following content:
+        return self._call_gemini(document_prompt(text, doc_type), language=language)
 
-{text[:50000]}
 
-Please provide a **concise legal summary** of this document.
-Strictly follow this structure and keep the total response under 3500 characters:
+class AsyncGeminiClient:
+    # Non-blocking variant used by the bot: one pooled keep-alive HTTP client shared by
+    # every handler, asyncio backoff, and a semaphore capping in-flight Gemini calls.
+    def __init__(self, max_concurrency: int = GEMINI_MAX_CONCURRENCY, max_connections: int = GEMINI_MAX_CONNECTIONS,
+                 cache: ResponseCache = None, scheduler: GeminiScheduler = None):
+        self.api_key = GEMINI_API_KEY
+        self.cache = cache
+        self.scheduler = scheduler
+        self.coalescer = RequestCoalescer()
+        self.url = GEMINI_URL
+        self.stream_url = GEMINI_STREAM_URL
+        self.system_instructions = SYSTEM_INSTRUCTIONS
+        self.max_connections = max_connections
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._http = None
 
-1. **Case Type/Nature**: What kind of document/case is this?
-2. **Key Facts**: The most important events or details.
-3. **Relevant Laws**: Laws or acts mentioned or applicable.
-4. **Current Status**: What is the current state of the matter?
-5. **Key Evidence/Points**: Main points supporting the case.
+    def start(self) -> None:
+        # Building the pool loads the CA bundle (~0.1 s), so it is done from the
+        # application's startup hook, or on first use, rather than at import time
+        if self._http is None:
+            self._http = httpx.AsyncClient(
+                timeout=30,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                ),
+            )
 
-Do NOT provide a full detailed analysis yet. Just the critical summary.
-Disclaimer: State clearly that this is an analysis for informational purposes only.
-"""
-        return self._call_gemini(prompt, language=language)
+    async def aclose(self) -> None:
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+    async def _wait_turn(self, payload: dict) -> None:
+        if self.scheduler is not None:
+            await self.scheduler.acquire(payload_tokens(payload))
+
+    async def _backoff(self, backoff: float) -> None:
+        # Jitter keeps concurrent retries from hitting the API again in lockstep
+        gemini_rate_limited.inc()
+        gemini_retries.inc()
+        if self.scheduler is not None:
+            self.scheduler.on_rate_limited()
+        delay = backoff + random.uniform(0, backoff)
+        logger.warning(f"Rate limit hit (429). Retrying in {delay:.1f} seconds...")
+        await asyncio.sleep(delay)
+
+    async def _call_gemini(self, prompt_text: str, language: str = None, intent: str = "other") -> str:
+        self.start()
+        payload = build_payload(prompt_text, language)
+
+        retries = 3
+        backoff = 2  # initial wait seconds
+
+        for attempt in range(retries):
+            try:
+                await self._wait_turn(payload)
+                async with self._semaphore:
+                    logger.info(f"Calling Gemini API: {self.url} (Attempt {attempt+1}/{retries})")
+                    start = time.perf_counter()
+                    response = await self._http.post(
+                        self.url,
+                        params={"key": self.api_key},
+                        json=payload,
+                    )
+                    gemini_seconds.observe(
+                        time.perf_counter() - start, kind="call", intent=intent, status=response.status_code
+                    )
+
+                if response.status_code == 429:
+                    if attempt < retries - 1:
+                        # Sleep outside the semaphore so waiting callers can use the slot
+                        await self._backoff(backoff)
+                        backoff *= 2
+                        continue
+                    gemini_rate_limited.inc()
+                    gemini_errors.inc(kind="call")
+                    return UNAVAILABLE_MESSAGE
+
+                response.raise_for_status()
+                data = response.json()
+                record_usage(data, intent)
+                return extract_text(data)
+
+            except httpx.HTTPError as e:
+                logger.error(f"Gemini API Request Error: {e}")
+                gemini_errors.inc(kind="call")
+                return UNAVAILABLE_MESSAGE
+
+        return UNAVAILABLE_MESSAGE
+
+    async def _stream_gemini(self, prompt_text: str, language: str = None, intent: str = "other"):
+        # Yields text deltas from the SSE stream. 429s are retried only before the first
+        # delta; a failure after that raises StreamInterrupted, since what was yielded so
+        # far is only part of the answer.
+        self.start()
+        payload = build_payload(prompt_text, language)
+
+        retries = 3
+        backoff = 2
+
+        for attempt in range(retries):
+            received = False
+            try:
+                await self._wait_turn(payload)
+                async with self._semaphore:
+                    logger.info(f"Streaming Gemini API: {self.stream_url} (Attempt {attempt+1}/{retries})")
+                    start = time.perf_counter()
+                    async with self._http.stream(
+                        "POST",
+                        self.stream_url,
+                        params={"key": self.api_key, "alt": "sse"},
+                        json=payload,
+                    ) as response:
+                        if response.status_code != 429:
+                            response.raise_for_status()
+                            # Each event repeats the running usageMetadata; the last one has the totals
+                            last_event = {}
+                            async for line in response.aiter_lines():
+                                if not line.startswith("data:"):
+                                    continue
+                                last_event = json.loads(line[5:])
+                                delta = extract_delta(last_event)
+                                if delta:
+                                    if not received:
+                                        gemini_first_token_seconds.observe(time.perf_counter() - start)
+                                    received = True
+                                    yield delta
+                            gemini_seconds.observe(
+                                time.perf_counter() - start, kind="stream", intent=intent, status=response.status_code
+                            )
+                            record_usage(last_event, intent)
+                            if not received:
+                                yield "Error: Empty response from AI."
+                            return
+                        gemini_seconds.observe(time.perf_counter() - start, kind="stream", intent=intent, status=429)
+
+                if attempt < retries - 1:
+                    await self._backoff(backoff)
+                    backoff *= 2
+                    continue
+                gemini_rate_limited.inc()
+                gemini_errors.inc(kind="stream")
+
+            except (httpx.HTTPError, json.JSONDecodeError) as e:
+                logger.error(f"Gemini API Stream Error: {e}")
+                gemini_errors.inc(kind="stream")
+                if received:
+                    raise StreamInterrupted(str(e)) from e
+
+            yield UNAVAILABLE_MESSAGE
+            return
+
+    async def stream_legal_explanation(self, query: str, language: str = None, references: list = None,
+                                       cacheable: bool = True):
+        cache = self.cache if cacheable else None
+        if cache is not None:
+            cached = await cache.get(query, language, template="explanation")
+            if cached is not None:
+                yield cached
+                return
+
+        # Someone is already streaming the same question: wait for their full answer
+        key = make_key(query, language, "explanation")
+        leader = self.coalescer.pending(key)
+        if leader is not None:
+            response = await self.coalescer.wait(leader)
+            if response is not None:
+                yield response
+                return
+
+        future = self.coalescer.claim(key)
+        parts = []
+        # Stays None if the stream is interrupted or abandoned: nothing is cached and
+        # coalesced waiters make their own call
+        response = None
+        try:
+            async for delta in self._stream_gemini(
+                explanation_prompt(query, references), language=language, intent="explanation"
+            ):
+                parts.append(delta)
+                yield delta
+            response = "".join(parts)
+        finally:
+            self.coalescer.release(key, future, response)
+        if cache is not None and is_cacheable(response):
+            await cache.set(query, response, language, template="explanation")
+
+    async def get_legal_explanation(self, query: str, language: str = None, references: list = None,
+                                    cacheable: bool = True) -> str:
+        # cacheable=False for free-form questions that are unlikely to repeat
+        cache = self.cache if cacheable else None
+        if cache is not None:
+            cached = await cache.get(query, language, template="explanation")
+            if cached is not None:
+                return cached
+        response = await self.coalescer.run(
+            make_key(query, language, "explanation"),
+            lambda: self._call_gemini(explanation_prompt(query, references), language=language, intent="explanation"),
+        )
+        # Never cache fallback/error text
+        if cache is not None and is_cacheable(response):
+            await cache.set(query, response, language, template="explanation")
+        return response
+
+    async def analyze_document(self, text: str, doc_type: str = "generic", language: str = None) -> str:
+        return await self._call_gemini(document_prompt(text, doc_type), language=language, intent="document")
+
+    async def summarize_chunk(self, text: str, doc_type: str, index: int, total: int) -> str:
+        return await self._call_gemini(chunk_summary_prompt(text, doc_type, index, total), intent="chunk")
+
+    async def merge_summaries(self, summaries: list, doc_type: str = "generic", language: str = None) -> str:
+        return await self._call_gemini(merge_prompt(summaries, doc_type), language=language, intent="merge")
@@ -0,0 +1,227 @@
+import re
+
+# Statute codes recognised before/after a section number (lowercase phrase -> short name)
+STATUTE_CODES = {
+    "ipc": "IPC", "indian penal code": "IPC",
+    "bns": "BNS", "bharatiya nyaya sanhita": "BNS",
+    "crpc": "CrPC", "cr.p.c": "CrPC", "cr.p.c.": "CrPC", "code of criminal procedure": "CrPC",
+    "bnss": "BNSS", "bharatiya nagarik suraksha sanhita": "BNSS",
+    "cpc": "CPC", "code of civil procedure": "CPC",
+    "iea": "IEA", "evidence act": "IEA", "indian evidence act": "IEA",
+    "bsa": "BSA", "bharatiya sakshya adhiniyam": "BSA",
+    "ni act": "NI Act", "negotiable instruments act": "NI Act",
+    "it act": "IT Act", "information technology act": "IT Act",
+    "constitution": "Constitution",
+}
+
+# keyword -> weight per intent. Matched on whole words, so "act" no longer fires on
+# "contract"/"fact" and a bare "help" only nudges towards case assistance.
+KEYWORDS = {
+    "explain_law": {
+        "section": 2, "sections": 2, "sec": 2, "article": 2, "articles": 2, "ipc": 2, "crpc": 2,
+        "bns": 2, "bnss": 2, "cpc": 2, "act": 1, "acts": 1, "law": 1, "laws": 1, "statute": 2,
+        "provision": 1, "punishment for": 2, "explain": 1, "legal meaning": 2, "definition of": 1,
+    },
+    "case_assist": {
+        "my case": 3, "our case": 3, "case strategy": 3, "against me": 2, "i am accused": 3,
+        "i was arrested": 3, "filed against": 2, "my fir": 2, "my complaint": 2, "win": 2,
+        "winning": 2, "defend": 2, "defence": 2, "defense": 2, "strengthen": 2, "strength": 1,
+        "strengths": 1, "weakness": 2, "weaknesses": 2, "strategy": 2, "help me": 1, "help": 0.5,
+    },
+    "change_lang": {
+        "language": 3, "reply in": 2, "respond in": 2, "answer in": 1, "switch to": 1,
+        "hindi": 1, "english": 1, "telugu": 1, "tamil": 1, "urdu": 1, "bengali": 1, "marathi": 1,
+        "kannada": 1, "malayalam": 1, "gujarati": 1, "punjabi": 1, "odia": 1,
+    },
+}
+
+# Order used to break score ties, mirroring the original rule order
+INTENT_ORDER = ("explain_law", "case_assist", "change_lang")
+STATUTE_WEIGHT = 4
+
+SECTION_WORDS = ("section", "sections", "sec", "sec.", "s.", "u/s", "u/s.")
+ARTICLE_WORDS = ("article", "art.")
+FILLER_WORDS = ("of", "the")
+# Words that may surround a bare reference ("what is IPC 420", "explain section 302")
+# without turning it into a question about it
+LOOKUP_WORDS = ("explain", "what", "whats", "s", "is", "meaning", "define", "show", "tell", "me", "about", "please")
+
+# Tokenizer for is_bare_reference(); abbreviations keep their dots so "s." and "art." are
+# recognisable, numbers keep letter suffixes and sub-clauses ("498a", "138(1)")
+_TOKEN = re.compile(r"u/s\.?|cr\.p\.c\.?|\d{1,4}[a-z]?(?:\(\d+\))?|[a-z]+\.?")
+_NUMBER = re.compile(r"\d{1,4}[a-z]?(?:\(\d+\))?")
+
+
+def _build_phrases() -> dict:
+    # Token tuple -> roles for every keyword, statute code, section marker and article marker
+    phrases = {}
+
+    def entry(phrase):
+        return phrases.setdefault(tuple(phrase.split()), {"kw": None, "code": None, "role": None})
+
+    for intent, keywords in KEYWORDS.items():
+        for keyword, weight in keywords.items():
+            entry(keyword)["kw"] = (intent, weight)
+    for raw, code in STATUTE_CODES.items():
+        entry(raw)["code"] = code
+    for word in SECTION_WORDS:
+        entry(word)["role"] = "section"
+    for word in ARTICLE_WORDS:
+        entry(word)["role"] = "article"
+    return phrases
+
+
+_PHRASES = _build_phrases()
+
+# Every token that can be part of a statute reference
+_REFERENCE_TOKENS = {
+    token for key, found in _PHRASES.items() if found["code"] or found["role"] for token in key
+} | set(FILLER_WORDS) | set(LOOKUP_WORDS)
+
+
+def _alternation(phrases) -> str:
+    # Phrases as one prefix-factored regex (a character trie: "sec(?:tions?|\.)?"-style),
+    # so the engine doesn't retry each phrase from scratch. Optional tails are greedy, so
+    # the longest phrase that ends on a word boundary wins.
+    root = {}
+    for phrase in phrases:
+        node = root
+        for char in " ".join(phrase.split()):
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def pattern(node) -> str:
+        branches = [
+            (r"\s+" if char == " " else re.escape(char)) + pattern(child)
+            for char, child in node.items() if char
+        ]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else f"(?:{'|'.join(branches)})"
+        return f"(?:{body})?" if "" in node else body
+
+    return pattern(root)
+
+
+# The whole classifier is one regex scan: each match is either a statute reference
+# ("section 302 of the IPC", "Article 21", "IPC s. 420") or a known phrase (keyword,
+# code, marker). Phrases are whole words; a lone code or marker scores as a keyword.
+_NUM = r"\d{1,4}[a-z]?(?:\(\d+\))?"
+_SEC = rf"(?:{_alternation(SECTION_WORDS)})(?![a-z])"
+_CODE = rf"(?:{_alternation(STATUTE_CODES)})(?![a-z])"
+_FILLER = rf"(?:[\s,]+(?:{_alternation(FILLER_WORDS)})(?![a-z]))*[\s,]+"
+_SCAN = re.compile(
+    rf"(?<![a-z])(?:"
+    rf"{_SEC}\s*(?P<section>{_NUM})(?:{_FILLER}(?P<section_code>{_CODE}))?"
+    rf"|(?:{_alternation(ARTICLE_WORDS)})(?![a-z])\s*(?P<article>{_NUM})"
+    rf"|(?P<code>{_CODE})\s*(?:{_SEC}\s*)?(?P<code_section>{_NUM})"
+    rf"|(?P<phrase>{_alternation(' '.join(key) for key in _PHRASES)})(?![a-z])"
+    rf")"
+)
+
+
+def _tokenize(text: str) -> list:
+    return _TOKEN.findall(text.lower())
+
+
+# Matched phrase -> (intent, weight), or None for codes and markers without a weight
+_WEIGHTS = {" ".join(key): found["kw"] for key, found in _PHRASES.items()}
+_UNKNOWN = object()
+
+
+def _code(match: str) -> str:
+    return STATUTE_CODES[" ".join(match.split())]
+
+
+class StatuteRef:
+    __slots__ = ("code", "section")
+
+    def __init__(self, code: str, section: str):
+        self.code = code
+        self.section = section
+
+    def __eq__(self, other):
+        return isinstance(other, StatuteRef) and (self.code, self.section) == (other.code, other.section)
+
+    def __hash__(self):
+        return hash((self.code, self.section))
+
+    def __repr__(self):
+        return f"StatuteRef({self.code!r}, {self.section!r})"
+
+    def __str__(self):
+        if self.code == "Constitution":
+            return f"Article {self.section} of the Constitution"
+        return f"Section {self.section} {self.code}" if self.code else f"Section {self.section}"
+
+
+class IntentResult:
+    __slots__ = ("intent", "scores", "entities")
+
+    def __init__(self, intent: str, scores: dict, entities: list):
+        self.intent = intent
+        self.scores = scores
+        self.entities = entities
+
+    def __repr__(self):
+        return f"IntentResult({self.intent!r}, scores={self.scores}, entities={self.entities})"
+
+
+def classify(text: str) -> IntentResult:
+    scores = dict.fromkeys(INTENT_ORDER, 0.0)
+    entities = []
+    for match in _SCAN.finditer(text.lower()):
+        kind = match.lastgroup
+        if kind == "phrase":
+            phrase = match.group(kind)
+            keyword = _WEIGHTS.get(phrase, _UNKNOWN)
+            if keyword is _UNKNOWN:
+                # Unusual spacing inside a multi-word phrase
+                keyword = _WEIGHTS[" ".join(phrase.split())]
+            if keyword is not None:
+                scores[keyword[0]] += keyword[1]
+        elif kind == "code_section":
+            entities.append(StatuteRef(_code(match.group("code")), match.group(kind).upper()))
+        elif kind == "article":
+            entities.append(StatuteRef("Constitution", match.group(kind).upper()))
+        else:
+            code = match.group("section_code")
+            entities.append(StatuteRef(_code(code) if code else None, match.group("section").upper()))
+
+    if entities:
+        scores["explain_law"] += STATUTE_WEIGHT
+
+    # A bare language name ("Hindi") is a language switch; inside a longer question
+    # ("explain IPC 420 in Hindi") it is not
+    words = len(text.split())
+    if words > 3 and scores["change_lang"] < 2:
+        scores["change_lang"] = 0.0
+
+    # Ties go to the intent listed first
+    best = INTENT_ORDER[0]
+    for intent in INTENT_ORDER[1:]:
+        if scores[intent] > scores[best]:
+            best = intent
+    if scores[best] >= 1:
+        return IntentResult(best, scores, entities)
+
+    # FAQ or General Legal Question
+    if text.strip().endswith("?") or words < 10:
+        return IntentResult("faq", scores, entities)
+    return IntentResult("general_query", scores, entities)
+
+
+def is_bare_reference(text: str) -> bool:
+    # True for "IPC 420", "Explain section 302", "What is Article 21?"; false as soon as
+    # anything else is asked about the section ("Is IPC 420 bailable?")
+    tokens = _tokenize(text)
+    if not any(_NUMBER.fullmatch(token) for token in tokens):
+        return False
+    return all(
+        _NUMBER.fullmatch(token) or token in _REFERENCE_TOKENS or token.rstrip(".") in _REFERENCE_TOKENS
+        for token in tokens
+    )
+
+
+def detect_intent(text: str) -> str:
+    return classify(text).intent
@@ -0,0 +1,201 @@
+import asyncio
+import json
+import logging
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+# Correlation ID of the update being handled; attached to every log line and span
+correlation_id = ContextVar("correlation_id", default="-")
+
+
+def new_correlation_id():
+    # Returns the ContextVar token so the caller can restore the previous ID when done
+    return correlation_id.set(uuid.uuid4().hex[:12])
+
+
+class CorrelationIdFilter(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.correlation_id = correlation_id.get()
+        return True
+
+
+def _label_key(labels: dict) -> tuple:
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key: tuple, extra: dict = None) -> str:
+    items = list(key) + sorted((extra or {}).items())
+    if not items:
+        return ""
+    body = ",".join(f'{name}="{str(value)}"' for name, value in items)
+    return "{" + body + "}"
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for key, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_format_labels(key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def total(self) -> int:
+        # Observations across all label sets
+        with self._lock:
+            return sum(series[2] for series in self._series.values())
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, (counts, total, count) in sorted(self._series.items()):
+            for bound, bucket_count in zip(self.buckets, counts):
+                lines.append(f"{self.name}_bucket{_format_labels(key, {'le': bound})} {bucket_count}")
+            lines.append(f"{self.name}_bucket{_format_labels(key, {'le': '+Inf'})} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {count}")
+        return lines
+
+
+class Gauge:
+    # Read at scrape time from a callback, e.g. a queue's current depth
+    def __init__(self, name: str, help_text: str, callback, kind: str = "gauge"):
+        self.name = name
+        self.help = help_text
+        self.callback = callback
+        self.kind = kind
+
+    def render(self) -> list:
+        try:
+            value = self.callback()
+        except Exception as e:
+            logger.warning(f"Metric {self.name} failed: {e}")
+            return []
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        if isinstance(value, dict):
+            for labels, item in value.items():
+                lines.append(f"{self.name}{_format_labels(labels)} {item}")
+        else:
+            lines.append(f"{self.name} {value}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self, prefix: str = "legaltune"):
+        self.prefix = prefix
+        self._metrics = {}
+
+    def counter(self, name: str, help_text: str) -> Counter:
+        return self._metrics.setdefault(name, Counter(f"{self.prefix}_{name}", help_text))
+
+    def histogram(self, name: str, help_text: str, buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._metrics.setdefault(name, Histogram(f"{self.prefix}_{name}", help_text, buckets))
+
+    def gauge(self, name: str, help_text: str, callback, kind: str = "gauge") -> Gauge:
+        self._metrics[name] = Gauge(f"{self.prefix}_{name}", help_text, callback, kind)
+        return self._metrics[name]
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+span_seconds = registry.histogram("span_seconds", "Duration of instrumented operations")
+request_seconds = registry.histogram("request_seconds", "End-to-end handler duration per update")
+gemini_seconds = registry.histogram("gemini_request_seconds", "Gemini HTTP call duration")
+gemini_first_token_seconds = registry.histogram("gemini_first_token_seconds", "Time to first streamed token")
+gemini_retries = registry.counter("gemini_retries_total", "Gemini call retries")
+gemini_rate_limited = registry.counter("gemini_rate_limited_total", "HTTP 429 responses from Gemini")
+gemini_errors = registry.counter("gemini_errors_total", "Failed Gemini calls")
+gemini_tokens = registry.counter("gemini_tokens_total", "Tokens billed by Gemini (usageMetadata), per intent")
+telegram_flood_waits = registry.counter("telegram_flood_waits_total", "RetryAfter flood-control answers from Telegram")
+
+
+@contextmanager
+def span(name: str, **labels):
+    # Times a block into span_seconds{span=name,...} and logs it with the correlation ID
+    start = time.perf_counter()
+    outcome = "ok"
+    try:
+        yield
+    except BaseException:
+        outcome = "error"
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        span_seconds.observe(elapsed, span=name, **labels)
+        log_event("span", span=name, seconds=round(elapsed, 4), outcome=outcome, **labels)
+
+
+def log_event(event: str, **fields) -> None:
+    # One JSON object per line so request logs can be grepped/ingested by correlation ID
+    fields = {"event": event, "correlation_id": correlation_id.get(), **fields}
+    logger.info(json.dumps(fields, default=str))
+
+
+async def _handle_http(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    try:
+        request_line = await reader.readline()
+        while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+            pass
+        path = request_line.split()[1].decode() if len(request_line.split()) > 1 else "/"
+        if path.startswith("/metrics"):
+            status, body = "200 OK", registry.render().encode()
+        else:
+            status, body = "404 Not Found", b"not found\n"
+        writer.write(
+            f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+        )
+        await writer.drain()
+    except Exception as e:
+        logger.warning(f"Metrics request failed: {e}")
+    finally:
+        writer.close()
+
+
+async def start_metrics_server(host: str, port: int):
+    # Minimal Prometheus scrape endpoint (GET /metrics) on the bot's own event loop
+    server = await asyncio.start_server(_handle_http, host, port)
+    logger.info(f"Metrics endpoint listening on {host}:{port}/metrics")
+    return server
@@ -0,0 +1,200 @@
+import asyncio
+import logging
+import re
+from collections import OrderedDict
+
+from telegram.error import BadRequest, RetryAfter
+
+from app.metrics import span, telegram_flood_waits
+from app.scheduler import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# One pass over the text: **bold**, *italic*, and the three characters HTML needs escaped.
+# Markers without a partner on the same chunk are left as literal asterisks, so the output
+# always has balanced tags.
+MARKUP = re.compile(r"\*\*(?=\S)(.+?)(?<=\S)\*\*|\*(?=[^\s*])([^*\n]+?)(?<=\S)\*|([<>&])")
+ESCAPES = {"<": "&lt;", ">": "&gt;", "&": "&amp;"}
+ESCAPE = re.compile(r"[<>&]")
+
+# Break preferences for long answers: paragraph, line, sentence, word
+SEPARATORS = ("\n\n", "\n", ". ", " ")
+
+
+def _escape(text: str) -> str:
+    return ESCAPE.sub(lambda m: ESCAPES[m.group()], text)
+
+
+def _convert(match) -> str:
+    bold, italic, char = match.groups()
+    if bold is not None:
+        return f"<b>{_escape(bold)}</b>"
+    if italic is not None:
+        return f"<i>{_escape(italic)}</i>"
+    return ESCAPES[char]
+
+
+def to_html(text: str) -> str:
+    return MARKUP.sub(_convert, text)
+
+
+def split_point(text: str, limit: int) -> int:
+    # Latest paragraph/line/sentence/word break before `limit` that isn't inside a
+    # **bold** span; hard cut at `limit` if there is none in the second half
+    if len(text) <= limit:
+        return len(text)
+    for sep in SEPARATORS:
+        cut = text.rfind(sep, 0, limit)
+        while cut > limit // 2:
+            if text.count("**", 0, cut) % 2 == 0:
+                return cut + len(sep.rstrip())
+            cut = text.rfind(sep, 0, cut)
+    return limit
+
+
+def split_text(text: str, limit: int) -> list:
+    chunks = []
+    while text:
+        cut = split_point(text, limit)
+        chunk = text[:cut].rstrip()
+        if chunk:
+            chunks.append(chunk)
+        text = text[cut:].lstrip()
+    return chunks
+
+
+def _seconds(retry_after) -> float:
+    # python-telegram-bot reports it as int seconds or a timedelta depending on version
+    return retry_after.total_seconds() if hasattr(retry_after, "total_seconds") else float(retry_after)
+
+
+class ChatQueue:
+    __slots__ = ("lock", "bucket", "waiters")
+
+    def __init__(self, rate: float, burst: int):
+        self.lock = asyncio.Lock()
+        self.bucket = TokenBucket(rate, burst)
+        self.waiters = 0
+
+
+class OutboundSender:
+    # Every Bot API call that shows text to a user goes through here. Calls to one chat run
+    # one at a time in order, paced by a per-chat bucket (Telegram allows about one message
+    # a second per chat) and a global one (about 30 a second per bot). Flood-control
+    # RetryAfter answers pause just that chat for the time Telegram asks. A status edit
+    # still waiting when a newer edit of the same message arrives is dropped.
+    def __init__(self, global_rate: float = 25, chat_rate: float = 1, chat_burst: int = 3,
+                 max_length: int = 3500, retries: int = 3):
+        self.global_bucket = TokenBucket(global_rate, max(1, int(global_rate)))
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_length = max_length
+        self.retries = retries
+        self.skipped_edits = 0
+        self._chats = {}
+        self._edit_seq = OrderedDict()
+        self._last_text = OrderedDict()
+
+    def share(self, workers: int) -> None:
+        # Webhook workers all post as the same bot; split the global rate between them
+        rate = self.global_bucket.rate / workers
+        self.global_bucket = TokenBucket(rate, max(1, int(rate)))
+
+    async def _turn(self, chat_id) -> ChatQueue:
+        queue = self._chats.get(chat_id)
+        if queue is None:
+            queue = self._chats[chat_id] = ChatQueue(self.chat_rate, self.chat_burst)
+        queue.waiters += 1
+        try:
+            await queue.lock.acquire()
+        finally:
+            # Also when cancelled while waiting (a superseded question), so the chat can be forgotten
+            queue.waiters -= 1
+        return queue
+
+    def _release(self, chat_id, queue: ChatQueue) -> None:
+        queue.lock.release()
+        # Forget idle chats once their bucket has refilled; a fresh one behaves the same
+        if not queue.waiters and queue.bucket.wait_time(queue.bucket.capacity) == 0:
+            self._chats.pop(chat_id, None)
+
+    async def _call(self, queue: ChatQueue, fn, **kwargs):
+        for attempt in range(self.retries + 1):
+            delay = max(queue.bucket.wait_time(1), self.global_bucket.wait_time(1))
+            while delay > 0:
+                await asyncio.sleep(delay)
+                delay = max(queue.bucket.wait_time(1), self.global_bucket.wait_time(1))
+            queue.bucket.consume(1)
+            self.global_bucket.consume(1)
+            try:
+                return await fn(**kwargs)
+            except RetryAfter as e:
+                if attempt == self.retries:
+                    raise
+                telegram_flood_waits.inc()
+                wait = _seconds(e.retry_after)
+                logger.warning(f"Telegram flood control, chat {kwargs.get('chat_id')} waits {wait:.0f}s")
+                queue.bucket.drain()
+                await asyncio.sleep(wait)
+
+    async def _deliver(self, queue: ChatQueue, fn, text: str, html: bool, parse_mode: str = None, **kwargs):
+        if html:
+            try:
+                return await self._call(queue, fn, text=to_html(text), parse_mode="HTML", **kwargs)
+            except BadRequest as e:
+                if "parse" not in str(e).lower():
+                    raise
+                logger.error(f"HTML Parse Error: {e}")
+        elif parse_mode:
+            kwargs["parse_mode"] = parse_mode
+        return await self._call(queue, fn, text=text, **kwargs)
+
+    async def send(self, bot, chat_id, text: str, html: bool = True, parse_mode: str = None,
+                   reply_markup=None) -> list:
+        # Long text goes out as several messages, split on paragraph/sentence boundaries.
+        # With html=False the text is sent as is, in parse_mode if given; a keyboard is
+        # attached to the last message.
+        messages = []
+        queue = await self._turn(chat_id)
+        try:
+            chunks = split_text(text, self.max_length)
+            for i, chunk in enumerate(chunks, start=1):
+                extra = {"reply_markup": reply_markup} if reply_markup is not None and i == len(chunks) else {}
+                with span("telegram_send"):
+                    messages.append(await self._deliver(
+                        queue, bot.send_message, chunk, html, parse_mode, chat_id=chat_id, **extra
+                    ))
+        finally:
+            self._release(chat_id, queue)
+        return messages
+
+    async def edit(self, bot, chat_id, message_id, text: str, html: bool = False) -> None:
+        key = (chat_id, message_id)
+        seq = self._edit_seq.get(key, 0) + 1
+        self._remember(self._edit_seq, key, seq)
+        queue = await self._turn(chat_id)
+        try:
+            if self._edit_seq.get(key) != seq:
+                # A newer edit of this message is queued behind us
+                self.skipped_edits += 1
+                return
+            if self._last_text.get(key) == (text, html):
+                return
+            try:
+                with span("telegram_edit"):
+                    await self._deliver(
+                        queue, bot.edit_message_text, text[:self.max_length], html,
+                        chat_id=chat_id, message_id=message_id,
+                    )
+            except BadRequest as e:
+                if "not modified" not in str(e).lower():
+                    raise
+            self._remember(self._last_text, key, (text, html))
+        finally:
+            self._release(chat_id, queue)
+
+    def _remember(self, store: OrderedDict, key, value, limit: int = 4096) -> None:
+        store[key] = value
+        store.move_to_end(key)
+        while len(store) > limit:
+            store.popitem(last=False)
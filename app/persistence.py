@@ -0,0 +1,186 @@
+import asyncio
+import logging
+import sqlite3
+import threading
+import time
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+logger = logging.getLogger(__name__)
+
+
+class SessionRecord:
+    # The only per-user state worth keeping across restarts. Anything else handlers put in
+    # user_data (e.g. button debounce markers) is ephemeral and not persisted.
+    __slots__ = ("language", "active_intent")
+
+    FIELDS = ("language", "active_intent")
+
+    def __init__(self, language: str = None, active_intent: str = None):
+        self.language = language
+        self.active_intent = active_intent
+
+    @classmethod
+    def from_user_data(cls, data: dict) -> "SessionRecord":
+        return cls(data.get("language"), data.get("active_intent"))
+
+    def apply_to(self, data: dict) -> None:
+        for field in self.FIELDS:
+            value = getattr(self, field)
+            if value is None:
+                data.pop(field, None)
+            else:
+                data[field] = value
+
+    def is_empty(self) -> bool:
+        return self.language is None and self.active_intent is None
+
+
+class SQLitePersistence(BasePersistence):
+    # Shared user session store for polling and webhook workers.
+    # - Lazy: nothing is loaded at start-up; a user's record is read once, on their first update.
+    # - Compact: one SessionRecord row per user instead of a serialized user_data blob.
+    # - Write-behind: PTB hands over dirty users every update_interval seconds; they are
+    #   buffered and written in a single transaction.
+    # - Bounded: evict_idle() drops users idle for a while from memory (not from disk).
+    def __init__(self, path: str, update_interval: float = 60):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=update_interval,
+        )
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        # WAL lets several worker processes read while one writes
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "user_id INTEGER PRIMARY KEY, language TEXT, active_intent TEXT, updated REAL NOT NULL)"
+        )
+        self._conn.commit()
+        # Per loaded user: version of the row last read/written here, and last activity
+        self._versions = {}
+        self._last_seen = {}
+        self._pending = {}
+        self._writer = None
+        self._evicting = set()
+
+    async def get_user_data(self) -> dict:
+        return {}
+
+    async def refresh_user_data(self, user_id: int, user_data: dict) -> None:
+        # Called before every update. Only a user's first update here reads the store, in a
+        # thread so a write in progress never blocks the event loop; after that the
+        # in-memory copy is the live one until evict_idle() drops it. A chat's updates all
+        # go to one webhook worker, so another worker's copy can only lag for group members.
+        self._last_seen[user_id] = time.monotonic()
+        if user_id in self._versions:
+            return
+        self._versions[user_id] = 0
+        row = await asyncio.to_thread(self._read, user_id)
+        if row is not None:
+            SessionRecord(row[0], row[1]).apply_to(user_data)
+            self._versions[user_id] = row[2]
+
+    def _read(self, user_id: int):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT language, active_intent, updated FROM sessions WHERE user_id = ?", (user_id,)
+            ).fetchone()
+
+    async def update_user_data(self, user_id: int, data: dict) -> None:
+        self._pending[user_id] = SessionRecord.from_user_data(data)
+        if self._writer is None or self._writer.done():
+            self._writer = asyncio.get_running_loop().create_task(self._write_pending())
+
+    async def _write_pending(self) -> None:
+        # Yield once so every update_user_data call of this persistence run joins the batch
+        await asyncio.sleep(0)
+        pending, self._pending = self._pending, {}
+        if pending:
+            await asyncio.to_thread(self._write, pending)
+
+    def _write(self, records: dict) -> None:
+        now = time.time()
+        upserts = [(uid, r.language, r.active_intent, now) for uid, r in records.items() if not r.is_empty()]
+        deletes = [(uid,) for uid, r in records.items() if r.is_empty()]
+        with self._lock:
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO sessions (user_id, language, active_intent, updated) VALUES (?, ?, ?, ?)",
+                    upserts,
+                )
+                self._conn.executemany("DELETE FROM sessions WHERE user_id = ?", deletes)
+        for user_id in records:
+            if user_id in self._versions:
+                self._versions[user_id] = now
+        logger.debug(f"Persisted {len(records)} sessions")
+
+    async def evict_idle(self, application, max_idle: float) -> int:
+        now = time.monotonic()
+        idle = [uid for uid, seen in self._last_seen.items() if now - seen > max_idle]
+        for user_id in idle:
+            # Save what is in memory first: PTB skips updates for users it is dropping
+            if user_id in application.user_data:
+                self._pending[user_id] = SessionRecord.from_user_data(application.user_data[user_id])
+            self._evicting.add(user_id)
+            application.drop_user_data(user_id)
+            self._versions.pop(user_id, None)
+            self._last_seen.pop(user_id, None)
+        await self.flush()
+        return len(idle)
+
+    async def drop_user_data(self, user_id: int) -> None:
+        if user_id in self._evicting:
+            # Evicted from memory only; the stored session stays
+            self._evicting.discard(user_id)
+            return
+        await asyncio.to_thread(self._delete, user_id)
+        self._versions.pop(user_id, None)
+        self._last_seen.pop(user_id, None)
+
+    def _delete(self, user_id: int) -> None:
+        with self._lock:
+            with self._conn:
+                self._conn.execute("DELETE FROM sessions WHERE user_id = ?", (user_id,))
+
+    async def flush(self) -> None:
+        if self._writer is not None:
+            await self._writer
+        pending, self._pending = self._pending, {}
+        if pending:
+            await asyncio.to_thread(self._write, pending)
+
+    # Unused data kinds
+    async def get_chat_data(self) -> dict:
+        return {}
+
+    async def get_bot_data(self) -> dict:
+        return {}
+
+    async def get_callback_data(self):
+        return None
+
+    async def get_conversations(self, name: str) -> dict:
+        return {}
+
+    async def update_chat_data(self, chat_id: int, data: dict) -> None:
+        pass
+
+    async def update_bot_data(self, data: dict) -> None:
+        pass
+
+    async def update_callback_data(self, data) -> None:
+        pass
+
+    async def update_conversation(self, name: str, key, new_state) -> None:
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data: dict) -> None:
+        pass
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        pass
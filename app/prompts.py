@@ -0,0 +1,82 @@
+import re
+from collections import Counter
+
+from app.document_processor import PAGE_BREAK
+from app.scheduler import estimate_tokens
+
+# Lines that are nothing but a page number: "12", "- 12 -", "Page 12", "Page 12 of 40", "12/40"
+PAGE_NUMBER = re.compile(r"^\W*(page|pg\.?|p\.)?\s*\d{1,4}\s*((of|/)\s*\d{1,4})?\W*$", re.IGNORECASE)
+SPACE_RUN = re.compile(r"[ \t ]+")
+BLANK_RUN = re.compile(r"\n\s*\n\s*\n+")
+
+# Lines looked at for running headers/footers at the top and bottom of each page
+EDGE_LINES = 3
+
+
+def _edge_key(line: str) -> str:
+    # Headers often carry the page number ("State v. X — page 4"), so compare without digits
+    return re.sub(r"\d+", "#", SPACE_RUN.sub(" ", line).strip().lower())
+
+
+def _edge_lines(lines: list) -> set:
+    # Indexes of the first and last few non-blank lines of a page
+    content = [i for i, line in enumerate(lines) if line.strip()]
+    return set(content[:EDGE_LINES] + content[-EDGE_LINES:])
+
+
+def strip_boilerplate(text: str) -> str:
+    # Drops page numbers and running headers/footers (a line found at the top or bottom
+    # of at least half the pages, 3 pages minimum) and collapses whitespace runs. Only
+    # page edges are touched, so numbered paragraphs in the body survive. Page breaks
+    # are kept so later stages can still split on them.
+    pages = [page.split("\n") for page in text.split(PAGE_BREAK)]
+    edges = [_edge_lines(lines) for lines in pages]
+    counts = Counter()
+    for lines, indexes in zip(pages, edges):
+        counts.update({_edge_key(lines[i]) for i in indexes})
+    threshold = max(3, (len(pages) + 1) // 2)
+    repeated = {key for key, count in counts.items() if count >= threshold}
+
+    cleaned = []
+    for lines, indexes in zip(pages, edges):
+        kept = []
+        for i, line in enumerate(lines):
+            line = SPACE_RUN.sub(" ", line).strip()
+            if i in indexes and (PAGE_NUMBER.match(line) or _edge_key(line) in repeated):
+                continue
+            kept.append(line)
+        cleaned.append(BLANK_RUN.sub("\n\n", "\n".join(kept)).strip())
+    return PAGE_BREAK.join(cleaned)
+
+
+def fit_to_budget(text: str, max_tokens: int) -> str:
+    # Cuts text to about max_tokens, preferring a page or paragraph boundary near the end
+    if estimate_tokens(text, 0) <= max_tokens:
+        return text
+    limit = max_tokens * 4
+    cut = max(text.rfind(PAGE_BREAK, 0, limit), text.rfind("\n\n", 0, limit))
+    if cut < limit * 0.8:
+        cut = limit
+    return text[:cut].rstrip() + "\n\n[... remaining text omitted ...]"
+
+
+def fit_sections(sections: list, max_tokens: int) -> list:
+    # Keeps leading sections (best-ranked first) while they fit; the first one is always
+    # kept, trimmed if it alone is over budget
+    kept = []
+    used = 0
+    for section in sections:
+        tokens = estimate_tokens(section, 0)
+        if kept and used + tokens > max_tokens:
+            break
+        kept.append(section if kept else fit_to_budget(section, max_tokens))
+        used += tokens
+    return kept
+
+
+def payload_tokens(payload: dict, expected_output: int = 1000) -> int:
+    # Estimate for a whole generateContent payload: system instruction plus contents
+    parts = list(payload.get("systemInstruction", {}).get("parts", []))
+    for content in payload.get("contents", []):
+        parts.extend(content.get("parts", []))
+    return sum(estimate_tokens(part.get("text", ""), 0) for part in parts) + expected_output
@@ -0,0 +1,153 @@
+import math
+import re
+import threading
+import time
+from collections import Counter, OrderedDict, defaultdict
+
+from app.analysis import split_into_chunks
+
+# Small enough that BM25 does not get drowned by filler words in user questions
+STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from has have how i if in is it its me my of on or "
+    "the this to under was what when where which who why will with you your".split()
+)
+
+
+def tokenize(text: str) -> list:
+    return [t for t in re.findall(r"[a-z0-9]+", text.lower()) if t not in STOPWORDS]
+
+
+class BM25Index:
+    # Plain in-memory BM25 over term postings; documents are referred to by insertion order
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings = defaultdict(list)
+        self._lengths = []
+        self._total_length = 0
+
+    def __len__(self) -> int:
+        return len(self._lengths)
+
+    def add(self, terms: list) -> int:
+        doc_id = len(self._lengths)
+        self._lengths.append(len(terms))
+        self._total_length += len(terms)
+        for term, count in Counter(terms).items():
+            self._postings[term].append((doc_id, count))
+        return doc_id
+
+    def search(self, terms: list, k: int = 3, min_score: float = 1.0) -> list:
+        # Returns (doc_id, score), best first. Weak tail matches that only share a
+        # generic word are dropped relative to the best hit.
+        if not terms or not self._lengths:
+            return []
+        total = len(self._lengths)
+        avg_length = self._total_length / total or 1
+        scores = defaultdict(float)
+        for term in set(terms):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc_id, tf in postings:
+                norm = self.k1 * (1 - self.b + self.b * self._lengths[doc_id] / avg_length)
+                scores[doc_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+        if not ranked:
+            return []
+        cutoff = max(min_score, ranked[0][1] / 2)
+        return [(doc_id, score) for doc_id, score in ranked if score >= cutoff]
+
+
+class DocumentSession:
+    __slots__ = ("file_names", "chunks", "index", "size", "expires")
+
+    def __init__(self, expires: float):
+        self.file_names = []
+        self.chunks = []
+        self.index = BM25Index()
+        self.size = 0
+        self.expires = expires
+
+
+class DocumentSessionStore:
+    # Keeps the extracted text of a chat's recent uploads, chunked and BM25-indexed, so
+    # follow-up questions send Gemini only the relevant excerpts. Memory only and short-lived
+    # (uploads are "not saved" per the privacy policy): bounded by total bytes across chats,
+    # expired after ttl, and dropped on /closecase.
+    def __init__(self, max_bytes: int = 32 * 1024 * 1024, ttl: float = 1800, chunk_chars: int = 1500,
+                 max_documents: int = 3):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.chunk_chars = chunk_chars
+        self.max_documents = max_documents
+        self._sessions = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def add_document(self, chat_id, file_name: str, text: str) -> None:
+        # Slow for large documents: callers run it in a thread. Chunking and tokenizing
+        # happen before taking the lock so lookups from the event loop don't wait on them.
+        chunks = [(chunk, tokenize(chunk)) for chunk in split_into_chunks(text, self.chunk_chars)]
+        with self._lock:
+            session = self._sessions.pop(chat_id, None)
+            if session is None or len(session.file_names) >= self.max_documents:
+                if session is not None:
+                    self._bytes -= session.size
+                session = DocumentSession(time.time() + self.ttl)
+            session.file_names.append(file_name)
+            for chunk, tokens in chunks:
+                session.chunks.append((file_name, chunk))
+                session.index.add(tokens)
+                size = len(chunk.encode("utf-8"))
+                session.size += size
+                self._bytes += size
+            session.expires = time.time() + self.ttl
+            self._sessions[chat_id] = session
+            # Least recently used chats go first
+            while self._bytes > self.max_bytes and len(self._sessions) > 1:
+                _, evicted = self._sessions.popitem(last=False)
+                self._bytes -= evicted.size
+
+    def has_session(self, chat_id) -> bool:
+        with self._lock:
+            return self._live(chat_id) is not None
+
+    def retrieve(self, chat_id, question: str, k: int = 4) -> list:
+        # (file_name, chunk) for the best matching chunks, in document order
+        with self._lock:
+            session = self._live(chat_id)
+            if session is None:
+                return []
+            session.expires = time.time() + self.ttl
+            self._sessions.move_to_end(chat_id)
+            hits = session.index.search(tokenize(question), k=k, min_score=0.0)
+            return [session.chunks[doc_id] for doc_id, _ in sorted(hits)]
+
+    def close(self, chat_id) -> bool:
+        with self._lock:
+            session = self._sessions.pop(chat_id, None)
+            if session is not None:
+                self._bytes -= session.size
+            return session is not None
+
+    def purge_expired(self) -> int:
+        now = time.time()
+        with self._lock:
+            expired = [chat_id for chat_id, s in self._sessions.items() if s.expires < now]
+            for chat_id in expired:
+                self._bytes -= self._sessions.pop(chat_id).size
+            return len(expired)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._sessions.clear()
+            self._bytes = 0
+
+    def _live(self, chat_id):
+        session = self._sessions.get(chat_id)
+        if session is not None and session.expires < time.time():
+            self._bytes -= self._sessions.pop(chat_id).size
+            return None
+        return session
@@ -0,0 +1,190 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict, deque
+from contextvars import ContextVar
+
+logger = logging.getLogger(__name__)
+
+# Lower value is served first
+INTERACTIVE = 0
+BULK = 1
+
+
+class RequestContext:
+    __slots__ = ("user_id", "priority", "notify")
+
+    def __init__(self, user_id=None, priority: int = INTERACTIVE, notify=None):
+        self.user_id = user_id
+        self.priority = priority
+        # Optional coroutine function called with the queue position when a request has to wait
+        self.notify = notify
+
+
+# Set by bot handlers so every Gemini call made while serving an update (including the
+# concurrent chunk calls of a document analysis) is attributed to that chat
+current_request = ContextVar("current_request", default=RequestContext())
+
+
+def set_request_context(user_id, priority: int = INTERACTIVE, notify=None) -> None:
+    current_request.set(RequestContext(user_id, priority, notify))
+
+
+def estimate_tokens(text: str, expected_output: int = 1000) -> int:
+    # ~4 characters per token is close enough for quota accounting
+    return len(text) // 4 + expected_output
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def consume(self, amount: float) -> None:
+        self._refill()
+        self.tokens -= min(amount, self.capacity)
+
+    def drain(self) -> None:
+        self._refill()
+        self.tokens = 0
+
+
+class Ticket:
+    __slots__ = ("user_id", "priority", "tokens", "future")
+
+    def __init__(self, user_id, priority: int, tokens: int, future):
+        self.user_id = user_id
+        self.priority = priority
+        self.tokens = tokens
+        self.future = future
+
+
+class GeminiScheduler:
+    # Central gate in front of the Gemini API. Requests wait in per-priority queues; within
+    # a priority, users are served round-robin so one chat's burst (e.g. the chunks of a long
+    # document) cannot starve everyone else. A single dispatcher releases tickets only as
+    # fast as the requests-per-minute and tokens-per-minute buckets allow.
+    def __init__(self, rpm: int = 60, tpm: int = 1000000):
+        self.requests = TokenBucket(rpm / 60, max(1, rpm // 10))
+        self.tokens = TokenBucket(tpm / 60, max(1, tpm // 10))
+        self._queues = {INTERACTIVE: OrderedDict(), BULK: OrderedDict()}
+        self._wakeup = None
+        self._dispatcher = None
+        self.rate_limited = 0
+
+    def share(self, workers: int) -> None:
+        # Several worker processes each run a scheduler; split the account quota between them
+        self.requests = TokenBucket(self.requests.rate / workers, max(1, self.requests.capacity // workers))
+        self.tokens = TokenBucket(self.tokens.rate / workers, max(1, self.tokens.capacity // workers))
+
+    @property
+    def depth(self) -> int:
+        return sum(len(q) for queues in self._queues.values() for q in queues.values())
+
+    async def acquire(self, tokens: int) -> None:
+        ctx = current_request.get()
+        loop = asyncio.get_running_loop()
+        ticket = Ticket(ctx.user_id, ctx.priority, tokens, loop.create_future())
+        self._queues.setdefault(ctx.priority, OrderedDict()).setdefault(ctx.user_id, deque()).append(ticket)
+        self._ensure_dispatcher()
+
+        try:
+            try:
+                await asyncio.wait_for(asyncio.shield(ticket.future), 0.5)
+                return
+            except asyncio.TimeoutError:
+                pass
+            if ctx.notify is not None and not ticket.future.done():
+                try:
+                    await ctx.notify(self.position(ticket))
+                except Exception as e:
+                    logger.warning(f"Queue position update failed: {e}")
+            await ticket.future
+        finally:
+            if not ticket.future.done():
+                ticket.future.cancel()
+
+    def on_rate_limited(self) -> None:
+        # Upstream 429: the API disagrees with our accounting, so pause everyone briefly
+        self.rate_limited += 1
+        self.requests.drain()
+
+    def position(self, ticket: Ticket) -> int:
+        for index, queued in enumerate(self._order(), start=1):
+            if queued is ticket:
+                return index
+        return 0
+
+    def _order(self):
+        # Dispatch order without mutating the queues: priority first, then round-robin users
+        for priority in sorted(self._queues):
+            queues = [list(q) for q in self._queues[priority].values()]
+            depth = max((len(q) for q in queues), default=0)
+            for i in range(depth):
+                for q in queues:
+                    if i < len(q):
+                        yield q[i]
+
+    def _peek_ticket(self):
+        for priority in sorted(self._queues):
+            queues = self._queues[priority]
+            while queues:
+                user_id, queue = next(iter(queues.items()))
+                # Drop tickets whose callers gave up (cancelled handlers)
+                while queue and queue[0].future.done():
+                    queue.popleft()
+                if queue:
+                    return queue[0]
+                del queues[user_id]
+        return None
+
+    def _pop_ticket(self, ticket: Ticket) -> None:
+        queues = self._queues[ticket.priority]
+        queue = queues.pop(ticket.user_id)
+        queue.popleft()
+        # Rotate this user to the back so the next ticket goes to someone else
+        if queue:
+            queues[ticket.user_id] = queue
+
+    def _ensure_dispatcher(self) -> None:
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+        self._wakeup.set()
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.get_running_loop().create_task(self._dispatch())
+
+    async def _dispatch(self) -> None:
+        while True:
+            ticket = self._peek_ticket()
+            if ticket is None:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            delay = max(self.requests.wait_time(1), self.tokens.wait_time(ticket.tokens))
+            if delay > 0:
+                # Re-peek afterwards: an interactive request may have arrived meanwhile
+                await asyncio.sleep(delay)
+                continue
+            self._pop_ticket(ticket)
+            self.requests.consume(1)
+            self.tokens.consume(ticket.tokens)
+            ticket.future.set_result(None)
+
+    async def close(self) -> None:
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            self._dispatcher = None
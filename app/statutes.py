@@ -0,0 +1,140 @@
+import json
+import logging
+import mmap
+
+from app.intent import classify, is_bare_reference
+from app.retrieval import BM25Index, tokenize
+
+logger = logging.getLogger(__name__)
+
+# Codes searched when a user names a section without saying which statute
+DEFAULT_CODES = ("IPC", "BNS", "CrPC", "BNSS")
+# Old and new criminal codes, suggested when a section was assumed to be in the other one
+COUNTERPARTS = {"IPC": "BNS", "BNS": "IPC", "CrPC": "BNSS", "BNSS": "CrPC"}
+
+
+class StatuteEntry:
+    __slots__ = ("code", "section", "title", "text", "punishment", "equivalent", "assumed", "ambiguous")
+
+    def __init__(self, code, section, title, text, punishment="", equivalent=""):
+        self.code = code
+        self.section = section
+        self.title = title
+        self.text = text
+        self.punishment = punishment
+        self.equivalent = equivalent
+        # Set by resolve() for references that named no statute: the only code with this
+        # section (assumed) or one of several candidates (ambiguous)
+        self.assumed = False
+        self.ambiguous = False
+
+    @property
+    def label(self) -> str:
+        if self.code == "Constitution":
+            return f"Article {self.section} of the Constitution"
+        return f"Section {self.section} {self.code}"
+
+    def to_reference(self) -> str:
+        lines = [f"{self.label}: {self.title}", self.text]
+        if self.punishment:
+            lines.append(f"Punishment: {self.punishment}")
+        if self.equivalent:
+            lines.append(f"Corresponding provision: {self.equivalent}")
+        return "\n".join(lines)
+
+    def to_answer(self) -> str:
+        lines = [f"**{self.label}: {self.title}**", "", self.text]
+        if self.assumed:
+            other = COUNTERPARTS.get(self.code, "IPC")
+            lines[1:1] = ["", f"(No statute was named, so this assumes the {self.code}. If you meant another "
+                              f"code, ask again with its name, e.g. \"{other} {self.section}\".)"]
+        if self.punishment:
+            lines += ["", f"**Punishment**: {self.punishment}"]
+        if self.equivalent:
+            lines += ["", f"**Corresponding provision**: {self.equivalent}"]
+        return "\n".join(lines)
+
+
+class StatuteIndex:
+    # Offline index over a JSON-lines file of statute sections. The file is memory-mapped;
+    # only byte offsets, the exact-lookup table and BM25 postings live in Python memory, and
+    # a section's text is decoded from the map when it is actually needed.
+    def __init__(self, path: str, k1: float = 1.2, b: float = 0.75):
+        self._file = open(path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._spans = []
+        self._exact = {}
+        self._bm25 = BM25Index(k1, b)
+        self._build()
+
+    def _build(self) -> None:
+        offset = 0
+        size = len(self._map)
+        while offset < size:
+            end = self._map.find(b"\n", offset)
+            if end == -1:
+                end = size
+            line = self._map[offset:end].strip()
+            if line:
+                doc_id = len(self._spans)
+                record = json.loads(line)
+                self._spans.append((offset, end))
+                self._exact[(record["code"].lower(), record["section"].upper())] = doc_id
+                self._bm25.add(tokenize(f"{record['code']} {record['title']} {record['text']}"))
+            offset = end + 1
+        logger.info(f"Statute index loaded: {len(self._spans)} sections")
+
+    def __len__(self) -> int:
+        return len(self._spans)
+
+    def entry(self, doc_id: int) -> StatuteEntry:
+        start, end = self._spans[doc_id]
+        record = json.loads(self._map[start:end])
+        return StatuteEntry(
+            record["code"], record["section"], record["title"], record["text"],
+            record.get("punishment", ""), record.get("equivalent", ""),
+        )
+
+    def lookup(self, code: str, section: str):
+        section = section.upper()
+        # "138(1)" falls back to "138"
+        for candidate in (section, section.split("(")[0]):
+            doc_id = self._exact.get((code.lower(), candidate))
+            if doc_id is not None:
+                return self.entry(doc_id)
+        return None
+
+    def candidates(self, code: str, section: str) -> list:
+        # The named code's entry, or every default code that has this section number
+        if code:
+            entry = self.lookup(code, section)
+            return [entry] if entry is not None else []
+        entries = [self.lookup(candidate, section) for candidate in DEFAULT_CODES]
+        entries = [entry for entry in entries if entry is not None]
+        for entry in entries:
+            entry.assumed = len(entries) == 1
+            entry.ambiguous = len(entries) > 1
+        return entries
+
+    def search(self, query: str, k: int = 3, min_score: float = 1.0) -> list:
+        return [(score, self.entry(doc_id)) for doc_id, score in self._bm25.search(tokenize(query), k, min_score)]
+
+    def resolve(self, text: str) -> list:
+        entries = {}
+        # Exact entries for every statute reference in the text ("IPC 420", "Article 21").
+        # A bare "Section 482" yields every code that has it, marked ambiguous.
+        for ref in classify(text).entities:
+            for entry in self.candidates(ref.code, ref.section):
+                entries.setdefault(entry.label, entry)
+        return list(entries.values())
+
+    def close(self) -> None:
+        self._map.close()
+        self._file.close()
+
+
+def is_direct_lookup(text: str, entries: list) -> bool:
+    # Answer from the index only when the message is the reference itself ("IPC 420",
+    # "Explain section 302") and every section it names resolved to a single provision;
+    # questions about a section and ambiguous numbers go to Gemini with the provisions attached
+    return bool(entries) and is_bare_reference(text) and not any(entry.ambiguous for entry in entries)
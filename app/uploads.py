@@ -0,0 +1,93 @@
+import asyncio
+import logging
+import os
+import tempfile
+from contextlib import asynccontextmanager
+
+from app.cache import content_hash
+from app.metrics import span
+
+logger = logging.getLogger(__name__)
+
+# Upload formats the extractor understands, grouped by size limit
+FORMATS = {
+    ".pdf": "pdf",
+    ".docx": "docx", ".doc": "docx",
+    ".jpg": "image", ".jpeg": "image", ".png": "image",
+    ".txt": "text",
+    ".zip": "zip",
+}
+
+
+class UploadRejected(Exception):
+    pass
+
+
+class UploadBudgetExceeded(Exception):
+    pass
+
+
+class UploadManager:
+    # Checks uploads against per-format size limits before downloading, keeps small files in
+    # memory and spools larger ones to a temp file (extraction workers then open the path
+    # instead of receiving a pickled copy), and caps the bytes held by all uploads at once.
+    def __init__(self, limits: dict, max_in_flight_bytes: int, spool_bytes: int = 1024 * 1024,
+                 tmp_dir: str = None):
+        self.limits = limits
+        self.max_in_flight_bytes = max_in_flight_bytes
+        self.spool_bytes = spool_bytes
+        self.tmp_dir = tmp_dir
+        self.in_flight_bytes = 0
+        self.rejected = 0
+
+    def check(self, file_ext: str, size: int) -> None:
+        kind = FORMATS.get(file_ext.lower())
+        if kind is None:
+            raise UploadRejected("This file type is not supported. Please send a PDF, DOCX, image, text or ZIP file.")
+        limit = self.limits.get(kind)
+        if size and limit and size > limit:
+            self.rejected += 1
+            raise UploadRejected(
+                f"This file is too large ({size / 2**20:.1f} MB). The limit for {kind.upper()} files "
+                f"is {limit / 2**20:.0f} MB."
+            )
+
+    @asynccontextmanager
+    async def reserve(self, size: int):
+        # Fail fast, like the extraction queue, rather than letting uploads pile up in memory
+        if self.in_flight_bytes and self.in_flight_bytes + size > self.max_in_flight_bytes:
+            self.rejected += 1
+            raise UploadBudgetExceeded("Too many large documents are being processed right now.")
+        self.in_flight_bytes += size
+        try:
+            yield
+        finally:
+            self.in_flight_bytes -= size
+
+    @asynccontextmanager
+    async def download(self, file, file_ext: str, size: int = None):
+        # Yields (source, digest): bytes for small files, a temp file path for large ones.
+        # The temp file is removed on exit.
+        size = size or file.file_size or 0
+        self.check(file_ext, size)
+        async with self.reserve(size):
+            if size <= self.spool_bytes:
+                with span("download"):
+                    data = await file.download_as_bytearray()
+                self.check(file_ext, len(data))
+                yield data, content_hash(data)
+                return
+
+            fd, path = tempfile.mkstemp(suffix=file_ext.lower(), prefix="upload-", dir=self.tmp_dir)
+            os.close(fd)
+            try:
+                with span("download", spooled="true"):
+                    await file.download_to_drive(path)
+                self.check(file_ext, os.path.getsize(path))
+                # Up to 20 MB read back from disk: hash it in a thread, not on the event loop
+                yield path, await asyncio.to_thread(content_hash, path)
+            finally:
+                try:
+                    os.remove(path)
+                except OSError as e:
+                    logger.warning(f"Could not remove spooled upload {path}: {e}")
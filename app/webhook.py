@@ -0,0 +1,151 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import sys
+from contextlib import asynccontextmanager
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import uvicorn
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import PlainTextResponse
+from telegram import Bot, Update
+
+from config import (
+    TELEGRAM_BOT_TOKEN, WEBHOOK_URL, WEBHOOK_SECRET, WEBHOOK_HOST, WEBHOOK_PORT, WEBHOOK_WORKERS,
+    SESSION_DB, SESSION_FLUSH_INTERVAL, METRICS_PORT, check_credentials,
+)
+from app.metrics import registry
+
+
+logger = logging.getLogger(__name__)
+
+
+def shard_for(data: dict, shards: int) -> int:
+    # Route every update of a chat to the same worker so its updates stay in order
+    for key, value in data.items():
+        if not isinstance(value, dict):
+            continue
+        chat = value.get("chat") or (value.get("message") or {}).get("chat")
+        if chat:
+            return chat["id"] % shards
+        user = value.get("from")
+        if user:
+            return user["id"] % shards
+    return data.get("update_id", 0) % shards
+
+
+def queue_depths(queues: list) -> dict:
+    depths = {}
+    for index, queue in enumerate(queues):
+        try:
+            depths[(("worker", index),)] = queue.qsize()
+        except NotImplementedError:
+            # multiprocessing queues can't report their size on macOS
+            pass
+    return depths
+
+
+def create_app(queues: list) -> FastAPI:
+    registry.gauge("webhook_queue_depth", "Updates waiting for each worker", lambda: queue_depths(queues))
+
+    @asynccontextmanager
+    async def lifespan(api: FastAPI):
+        bot = Bot(TELEGRAM_BOT_TOKEN)
+        async with bot:
+            await bot.set_webhook(
+                url=f"{WEBHOOK_URL.rstrip('/')}/webhook",
+                secret_token=WEBHOOK_SECRET or None,
+                allowed_updates=Update.ALL_TYPES,
+                drop_pending_updates=False,
+            )
+        logger.info(f"Webhook registered at {WEBHOOK_URL}, {len(queues)} workers")
+        yield
+
+    api = FastAPI(lifespan=lifespan)
+
+    @api.post("/webhook")
+    async def webhook(request: Request):
+        if WEBHOOK_SECRET and request.headers.get("X-Telegram-Bot-Api-Secret-Token") != WEBHOOK_SECRET:
+            raise HTTPException(status_code=403)
+        data = await request.json()
+        # Acknowledge immediately; the worker does the actual processing
+        queues[shard_for(data, len(queues))].put(data)
+        return {"ok": True}
+
+    @api.get("/healthz")
+    async def healthz():
+        return {"ok": True, "workers": len(queues)}
+
+    @api.get("/metrics")
+    async def metrics():
+        # Dispatcher-side metrics only; each worker serves its own on METRICS_PORT + index
+        return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+    return api
+
+
+def run_worker(queue, workers: int, index: int) -> None:
+    asyncio.run(_worker_main(queue, workers, index))
+
+
+async def _worker_main(queue, workers: int, index: int) -> None:
+    from app import bot
+    from app.persistence import SQLitePersistence
+
+    bot.gemini_scheduler.share(workers)
+    bot.outbound.share(workers)
+    bot.extraction_service.share(workers)
+    if METRICS_PORT:
+        bot.metrics_port = METRICS_PORT + index
+    application = bot.build_application(SQLitePersistence(SESSION_DB, SESSION_FLUSH_INTERVAL))
+
+    # post_init/post_shutdown only run automatically under run_polling/run_webhook
+    await application.initialize()
+    await bot.on_startup(application)
+    await application.start()
+
+    loop = asyncio.get_running_loop()
+    try:
+        while True:
+            data = await loop.run_in_executor(None, queue.get)
+            if data is None:
+                break
+            # Handed to the application in arrival order, same as polling mode
+            await application.update_queue.put(Update.de_json(data, application.bot))
+    finally:
+        await application.stop()
+        await application.shutdown()
+        await bot.on_shutdown(application)
+
+
+def main() -> None:
+    logging.basicConfig(
+        format='%(asctime)s - %(name)s - %(levelname)s - %(processName)s - %(message)s',
+        level=logging.INFO
+    )
+    check_credentials()
+    if not WEBHOOK_URL:
+        raise ValueError("WEBHOOK_URL not found in .env")
+
+    ctx = multiprocessing.get_context("spawn")
+    queues = [ctx.Queue() for _ in range(WEBHOOK_WORKERS)]
+    processes = [
+        ctx.Process(target=run_worker, args=(queue, WEBHOOK_WORKERS, i), name=f"worker-{i}")
+        for i, queue in enumerate(queues)
+    ]
+    for process in processes:
+        process.start()
+
+    try:
+        uvicorn.run(create_app(queues), host=WEBHOOK_HOST, port=WEBHOOK_PORT)
+    finally:
+        for queue in queues:
+            queue.put(None)
+        for process in processes:
+            process.join(timeout=30)
+
+
+if __name__ == "__main__":
+    main()
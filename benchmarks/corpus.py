@@ -0,0 +1,143 @@
+# Generates the sample documents used by benchmarks/loadtest.py: text PDFs, DOCX files,
+# scanned-page images and an image-only (scanned) PDF. Everything is built locally so the
+# corpus doesn't have to live in git; each file embeds a marker phrase that extraction must
+# recover, which is what catches extraction regressions.
+#
+#   python benchmarks/corpus.py [--out benchmarks/corpus]
+
+import argparse
+import io
+import os
+import random
+
+from docx import Document
+from PIL import Image, ImageDraw, ImageFilter, ImageFont
+
+DEFAULT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "corpus")
+
+MARKER = "SECURITY DEPOSIT OF RUPEES FIFTY THOUSAND"
+
+CLAUSES = [
+    "The Tenant shall pay the monthly rent on or before the fifth day of every month.",
+    "The Landlord shall return the security deposit within thirty days of vacating the premises.",
+    "Either party may terminate this agreement by giving two months notice in writing.",
+    "The Tenant shall not sublet the premises without the prior written consent of the Landlord.",
+    "Any dispute arising out of this agreement shall be referred to arbitration in Hyderabad.",
+    "The Accused is charged under Section 420 of the Indian Penal Code for cheating.",
+    "The complainant states that the cheque issued on the said date was dishonoured.",
+    "The Employee shall not disclose confidential information during or after employment.",
+    "This agreement shall be governed by the laws of India and courts at Chennai.",
+    "The Licensee shall keep the premises in good and tenantable condition at all times.",
+]
+
+# Small, medium and large documents (pages)
+SIZES = {"small": 2, "medium": 12, "large": 60}
+
+
+def page_lines(page: int, lines: int = 40, seed: int = 0) -> list:
+    rng = random.Random(seed * 1000 + page)
+    body = [f"Page {page + 1}. Clause {page * lines + i + 1}. {rng.choice(CLAUSES)}" for i in range(lines)]
+    if page == 0:
+        body.insert(1, f"The Tenant has paid a {MARKER} to the Landlord.")
+    return body
+
+
+def _pdf_escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def write_text_pdf(path: str, pages: int, seed: int = 0) -> None:
+    # Minimal hand-written PDF (Helvetica text content streams) - no PDF library needed
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for page in range(pages):
+        lines = page_lines(page, seed=seed)
+        stream = "BT /F1 9 Tf 40 800 Td 12 TL " + " ".join(f"({_pdf_escape(line)}) '" for line in lines) + " ET"
+        stream = stream.encode("latin-1")
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        content_id = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_id
+        )
+        kids.append(len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [" + b" ".join(b"%d 0 R" % k for k in kids) + b"] /Count %d >>" % pages
+
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(out.tell())
+        out.write(b"%d 0 obj\n" % number + body + b"\nendobj\n")
+    xref = out.tell()
+    out.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+    for offset in offsets:
+        out.write(b"%010d 00000 n \n" % offset)
+    out.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref))
+    with open(path, "wb") as f:
+        f.write(out.getvalue())
+
+
+def write_docx(path: str, pages: int, seed: int = 0) -> None:
+    document = Document()
+    document.add_heading("Rental Agreement", level=1)
+    for page in range(pages):
+        for line in page_lines(page, seed=seed):
+            document.add_paragraph(line)
+    document.save(path)
+
+
+def scanned_page(page: int, seed: int = 0) -> Image.Image:
+    # A grey, slightly rotated and blurred page, roughly what a phone photo of a notice looks like
+    rng = random.Random(seed * 1000 + page)
+    image = Image.new("L", (1654, 2339), color=235)
+    draw = ImageDraw.Draw(image)
+    try:
+        font = ImageFont.load_default(size=28)
+    except TypeError:
+        font = ImageFont.load_default()
+    for i, line in enumerate(page_lines(page, lines=30, seed=seed)):
+        draw.text((90, 120 + i * 70), line[:95], fill=30, font=font)
+    for _ in range(4000):
+        draw.point((rng.randrange(image.width), rng.randrange(image.height)), fill=rng.randrange(150, 220))
+    image = image.rotate(rng.uniform(-1.5, 1.5), fillcolor=235, expand=False)
+    return image.filter(ImageFilter.GaussianBlur(0.6))
+
+
+def write_scanned_image(path: str, seed: int = 0) -> None:
+    scanned_page(0, seed).convert("RGB").save(path, quality=85)
+
+
+def write_scanned_pdf(path: str, pages: int, seed: int = 0) -> None:
+    images = [scanned_page(page, seed).convert("RGB") for page in range(pages)]
+    images[0].save(path, save_all=True, append_images=images[1:], resolution=200)
+
+
+def build_corpus(out_dir: str = DEFAULT_DIR) -> list:
+    # Returns [(path, kind)] and skips files that already exist
+    os.makedirs(out_dir, exist_ok=True)
+    files = []
+    for size, pages in SIZES.items():
+        files.append((os.path.join(out_dir, f"agreement_{size}.pdf"), "pdf", lambda p, n=pages: write_text_pdf(p, n)))
+        files.append((os.path.join(out_dir, f"agreement_{size}.docx"), "docx", lambda p, n=pages: write_docx(p, n)))
+    files.append((os.path.join(out_dir, "notice_scan.jpg"), "image", write_scanned_image))
+    files.append((os.path.join(out_dir, "notice_scan.pdf"), "scanned_pdf", lambda p: write_scanned_pdf(p, 2)))
+
+    corpus = []
+    for path, kind, writer in files:
+        if not os.path.exists(path):
+            writer(path)
+        corpus.append((path, kind))
+    return corpus
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Generate the benchmark document corpus")
+    parser.add_argument("--out", default=DEFAULT_DIR)
+    args = parser.parse_args()
+    for path, kind in build_corpus(args.out):
+        print(f"{kind:12} {os.path.getsize(path):>10,} bytes  {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+# In-process stand-in for the Telegram Bot API, plugged into python-telegram-bot as its
+# request backend, plus a factory for realistic incoming updates. Outgoing calls get a
+# configurable round-trip delay and are counted, and "uploaded" files are served from memory.
+# A share of sends/edits can be refused with flood-control 429s (RetryAfter).
+
+import asyncio
+import itertools
+import json
+import random
+import time
+from collections import Counter
+
+from telegram import Update
+from telegram.request import BaseRequest
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "LegalTune", "username": "legaltune_bench_bot"}
+
+
+class FakeTelegramRequest(BaseRequest):
+    def __init__(self, latency: float = 0.05, flood_rate: float = 0.0, retry_after: int = 1, seed: int = None):
+        self.latency = latency
+        self.flood_rate = flood_rate
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.calls = Counter()
+        self.files = {}
+        self.last_text = {}
+        self._message_ids = itertools.count(1000)
+
+    @property
+    def read_timeout(self):
+        return 30
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    def add_file(self, file_id: str, data: bytes) -> None:
+        self.files[file_id] = data
+
+    def _message(self, params: dict) -> dict:
+        return {
+            "message_id": params.get("message_id") or next(self._message_ids),
+            "date": int(time.time()),
+            "chat": {"id": int(params.get("chat_id", 0)), "type": "private"},
+            "from": BOT_USER,
+            "text": params.get("text", ""),
+        }
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None, write_timeout=None,
+                         connect_timeout=None, pool_timeout=None):
+        await asyncio.sleep(self.latency)
+        if "/file/bot" in url:
+            self.calls["download"] += 1
+            data = self.files.get(url.rsplit("/", 1)[-1])
+            return (200, data) if data is not None else (404, b"")
+
+        endpoint = url.rsplit("/", 1)[-1]
+        self.calls[endpoint] += 1
+        params = request_data.parameters if request_data is not None else {}
+        if endpoint in ("sendMessage", "editMessageText") and self.random.random() < self.flood_rate:
+            self.calls["flood"] += 1
+            return 429, json.dumps({
+                "ok": False, "error_code": 429,
+                "description": f"Too Many Requests: retry after {self.retry_after}",
+                "parameters": {"retry_after": self.retry_after},
+            }).encode()
+        if endpoint == "getMe":
+            result = BOT_USER
+        elif endpoint in ("sendMessage", "editMessageText"):
+            result = self._message(params)
+            self.last_text[result["chat"]["id"]] = result["text"]
+        elif endpoint == "getFile":
+            file_id = params["file_id"]
+            result = {
+                "file_id": file_id,
+                "file_unique_id": file_id,
+                "file_size": len(self.files.get(file_id, b"")),
+                "file_path": f"documents/{file_id}",
+            }
+        else:
+            result = True
+        return 200, json.dumps({"ok": True, "result": result}).encode()
+
+
+class UpdateFactory:
+    # Builds Update objects the way Telegram would deliver them to the bot
+    def __init__(self, bot, request: FakeTelegramRequest):
+        self.bot = bot
+        self.request = request
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+
+    def _message(self, chat_id: int, **fields) -> dict:
+        return {
+            "message_id": next(self._message_ids),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private", "first_name": f"User{chat_id}"},
+            "from": {"id": chat_id, "is_bot": False, "first_name": f"User{chat_id}"},
+            **fields,
+        }
+
+    def _update(self, message: dict) -> Update:
+        return Update.de_json({"update_id": next(self._update_ids), "message": message}, self.bot)
+
+    def text(self, chat_id: int, text: str) -> Update:
+        fields = {"text": text}
+        if text.startswith("/"):
+            command = text.split()[0]
+            fields["entities"] = [{"type": "bot_command", "offset": 0, "length": len(command)}]
+        return self._update(self._message(chat_id, **fields))
+
+    def document(self, chat_id: int, file_name: str, data: bytes, file_id: str) -> Update:
+        self.request.add_file(file_id, data)
+        document = {"file_id": file_id, "file_unique_id": file_id, "file_name": file_name, "file_size": len(data)}
+        return self._update(self._message(chat_id, document=document))
+
+    def photo(self, chat_id: int, data: bytes, file_id: str) -> Update:
+        self.request.add_file(file_id, data)
+        photo = [{"file_id": file_id, "file_unique_id": file_id, "width": 1654, "height": 2339, "file_size": len(data)}]
+        return self._update(self._message(chat_id, photo=photo))
@@ -0,0 +1,120 @@
+# Compares the compiled intent classifier (app/intent.py) with the original keyword-scan
+# detect_intent: accuracy and per-message latency. SAMPLES were written alongside the
+# classifier and act as a regression set; HELDOUT was labelled from how users phrase
+# things and is deliberately not tuned against, so its score is the honest one.
+#
+#   python benchmarks/intent_benchmark.py
+
+import os
+import sys
+import timeit
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.intent import detect_intent
+
+
+def legacy_detect_intent(text: str) -> str:
+    # Original implementation from app/bot.py, kept here as the baseline
+    text = text.lower()
+    if any(k in text for k in ["section", "ipc", "act", "article", "law"]):
+        return "explain_law"
+    if any(k in text for k in ["my case", "help", "win", "defend", "strength", "weakness"]):
+        return "case_assist"
+    if any(k in text for k in ["hindi", "english", "telugu", "tamil", "urdu", "language"]):
+        return "change_lang"
+    if text.endswith("?") or len(text.split()) < 10:
+        return "faq"
+    return "general_query"
+
+
+SAMPLES = [
+    ("IPC 420", "explain_law"),
+    ("Section 302", "explain_law"),
+    ("Explain section 138 of the NI Act", "explain_law"),
+    ("What is Article 21 of the Constitution?", "explain_law"),
+    ("u/s 498A IPC meaning", "explain_law"),
+    ("s. 125 CrPC maintenance for wife", "explain_law"),
+    ("BNS 103 punishment", "explain_law"),
+    ("Explain IPC 420 in Hindi", "explain_law"),
+    ("What does the Consumer Protection Act say about refunds?", "explain_law"),
+    ("punishment for cheque bounce", "explain_law"),
+    ("How can I win my case against my landlord who refuses to return my deposit", "case_assist"),
+    ("A false FIR was filed against me by my neighbour, what should I do to defend myself", "case_assist"),
+    ("What are the weaknesses in my case", "case_assist"),
+    ("How do I strengthen my defence in a dowry complaint", "case_assist"),
+    ("I was arrested yesterday and released, the police are asking me to come again", "case_assist"),
+    ("Hindi", "change_lang"),
+    ("telugu", "change_lang"),
+    ("Please reply in Tamil from now on", "change_lang"),
+    ("Change language to Urdu", "change_lang"),
+    ("What is bail?", "faq"),
+    ("what is anticipatory bail?", "faq"),
+    ("Can police refuse to register an FIR?", "faq"),
+    ("What are the facts I need for a divorce petition?", "faq"),
+    ("I signed a contract with a builder", "faq"),
+    ("How long does a civil suit take?", "faq"),
+    ("Is a verbal agreement valid?", "faq"),
+    ("help", "faq"),
+    ("The builder has delayed possession of the flat by three years and stopped answering calls", "general_query"),
+    ("My employer has not paid my salary for four months and keeps making excuses every week", "general_query"),
+    ("The shopkeeper sold me a defective phone and refuses to replace or repair it now", "general_query"),
+]
+
+HELDOUT = [
+    ("what's the punishment under 302 IPC", "explain_law"),
+    ("Is dowry demand a crime under BNS?", "explain_law"),
+    ("Tell me about the Right to Information Act", "explain_law"),
+    ("what does section 66A say", "explain_law"),
+    ("meaning of cognizable offence", "explain_law"),
+    ("difference between bailable and non-bailable offences", "explain_law"),
+    ("which law covers cyber stalking", "explain_law"),
+    ("explain the new criminal laws that replaced the IPC", "explain_law"),
+    ("my husband is threatening to take the kids away, what can I do", "case_assist"),
+    ("the police took my brother last night without a warrant, how do we get him out", "case_assist"),
+    ("I got a legal notice from my bank for loan default, how should I respond to it", "case_assist"),
+    ("Can you help me prepare for my hearing next week?", "case_assist"),
+    ("our landlord has filed against us for eviction, how do we fight it", "case_assist"),
+    ("what are my chances if I go to court over unpaid wages", "case_assist"),
+    ("can you speak in marathi", "change_lang"),
+    ("Kannada please", "change_lang"),
+    ("english", "change_lang"),
+    ("switch to gujarati", "change_lang"),
+    ("answers in hindi from now", "change_lang"),
+    ("Do I need a lawyer for consumer court?", "faq"),
+    ("How many days do I have to file an appeal?", "faq"),
+    ("Can a minor make a will?", "faq"),
+    ("what is the age of majority in india?", "faq"),
+    ("Is it legal to record a phone call?", "faq"),
+    ("what is a PIL", "faq"),
+    ("I bought a second hand car and the seller never transferred the registration to my name", "general_query"),
+    ("Our housing society is charging maintenance for a parking spot that we were never given", "general_query"),
+    ("My father died without a will and my uncle is now claiming a share of our ancestral house", "general_query"),
+]
+
+
+def evaluate(fn, samples) -> float:
+    return sum(fn(text) == label for text, label in samples) / len(samples)
+
+
+def latency_us(fn, rounds: int = 2000) -> float:
+    texts = [text for text, _ in SAMPLES + HELDOUT]
+    seconds = timeit.timeit(lambda: [fn(t) for t in texts], number=rounds)
+    return seconds / (rounds * len(texts)) * 1e6
+
+
+def main() -> None:
+    for name, fn in (("legacy", legacy_detect_intent), ("compiled", detect_intent)):
+        print(f"{name:>9}: accuracy {evaluate(fn, SAMPLES):6.1%} regression, {evaluate(fn, HELDOUT):6.1%} held-out"
+              f"   {latency_us(fn):6.2f} us/message")
+
+    for title, samples in (("regression", SAMPLES), ("held-out", HELDOUT)):
+        print(f"\nMisclassified by the compiled classifier ({title}):")
+        for text, label in samples:
+            got = detect_intent(text)
+            if got != label:
+                print(f"  {text!r}: expected {label}, got {got}")
+
+
+if __name__ == "__main__":
+    main()
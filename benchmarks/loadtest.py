@@ -0,0 +1,335 @@
+# Offline load test: drives the real handlers (handle_text, handle_document) and the
+# extraction pipeline against a local mock Gemini server and an in-process fake Telegram
+# API, then reports p50/p95/p99 latency, throughput and memory. Nothing leaves the machine.
+#
+#   python benchmarks/loadtest.py --scenario text --concurrency 50 --requests 500
+#   python benchmarks/loadtest.py --scenario document --concurrency 4 --requests 24
+#   python benchmarks/loadtest.py --scenario batch --batch-size 4 --concurrency 2 --requests 6 [--zip]
+#   python benchmarks/loadtest.py --scenario extract --concurrency 4 --requests 40
+#   python benchmarks/loadtest.py --scenario mixed --rate-limit 0.05 --json results.json
+#
+# "extract" checks that every corpus file still yields its marker phrase and exits non-zero
+# if any does not, so it can run as a pre-deploy regression gate.
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import resource
+import socket
+import subprocess
+import sys
+import time
+import zipfile
+from collections import defaultdict
+from io import BytesIO
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(ROOT)
+sys.path.append(BENCH_DIR)
+
+# The bot reads its settings at import time: lift the rate limits (the mock has none),
+# keep everything off disk and off the network
+os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "123456:benchmark")
+os.environ.setdefault("GEMINI_RPM", "1000000")
+os.environ.setdefault("GEMINI_TPM", "1000000000")
+os.environ.setdefault("METRICS_PORT", "0")
+os.environ.setdefault("RESPONSE_CACHE_DB", "")
+
+import mock_gemini
+from corpus import MARKER, build_corpus, DEFAULT_DIR
+from fake_telegram import FakeTelegramRequest, UpdateFactory
+
+TEXT_QUERIES = [
+    "IPC 420",
+    "Explain section 138 of the NI Act",
+    "What is the punishment for cheque bounce in case number {n}?",
+    "My landlord is not returning my deposit of {n} rupees, what can I do?",
+    "How can I win my case against my employer who has not paid salary for {n} months",
+    "Is a verbal agreement for a loan of {n} rupees valid?",
+    "What are my rights if police refuse to file an FIR, reference {n}?",
+]
+
+EXTENSIONS = {"pdf": ".pdf", "docx": ".docx", "image": ".jpg", "scanned_pdf": ".pdf"}
+
+
+def percentile(values: list, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def rss_mb() -> float:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError):
+        return 0.0
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.failures = defaultdict(int)
+        self.peak_rss = 0.0
+        self.start = self.end = 0.0
+
+    def record(self, label: str, seconds: float, ok: bool = True) -> None:
+        self.latencies[label].append(seconds)
+        if not ok:
+            self.failures[label] += 1
+
+    async def sample_memory(self, interval: float = 0.2) -> None:
+        while True:
+            self.peak_rss = max(self.peak_rss, rss_mb())
+            await asyncio.sleep(interval)
+
+    def report(self) -> dict:
+        wall = self.end - self.start
+        rows = {}
+        for label, values in sorted(self.latencies.items()):
+            rows[label] = {
+                "count": len(values),
+                "failures": self.failures[label],
+                "p50": percentile(values, 50),
+                "p95": percentile(values, 95),
+                "p99": percentile(values, 99),
+                "max": max(values),
+                "throughput": len(values) / wall if wall else 0.0,
+            }
+        children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+        return {
+            "wall_seconds": wall,
+            "operations": rows,
+            "peak_rss_mb": self.peak_rss,
+            "peak_child_rss_mb": children,
+        }
+
+
+def print_report(result: dict) -> None:
+    print(f"\n{'operation':22} {'count':>6} {'fail':>5} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8} {'req/s':>8}")
+    for label, row in result["operations"].items():
+        print(
+            f"{label:22} {row['count']:>6} {row['failures']:>5} {row['p50']:>8.3f} {row['p95']:>8.3f} "
+            f"{row['p99']:>8.3f} {row['max']:>8.3f} {row['throughput']:>8.2f}"
+        )
+    print(f"\nwall time {result['wall_seconds']:.2f}s, peak RSS {result['peak_rss_mb']:.0f} MB "
+          f"(largest worker process {result['peak_child_rss_mb']:.0f} MB)")
+    if "telegram_calls" in result:
+        print(f"Telegram calls: {result['telegram_calls']}")
+    if "gemini_calls" in result:
+        print(f"Gemini calls: {result['gemini_calls']}")
+    if "response_cache" in result:
+        print(f"Response cache: {result['response_cache']}")
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_mock_gemini(args) -> tuple:
+    # Separate process so serving the mock doesn't steal time from the event loop under test
+    port = free_port()
+    process = subprocess.Popen([
+        sys.executable, os.path.join(BENCH_DIR, "mock_gemini.py"), "--port", str(port),
+        "--latency", str(args.latency), "--jitter", str(args.jitter), "--rate-limit", str(args.rate_limit),
+        "--chunks", str(args.chunks), "--chunk-delay", str(args.chunk_delay),
+    ], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return process, f"http://127.0.0.1:{port}/v1/models/mock"
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError("Mock Gemini server did not start")
+
+
+def document_jobs(corpus: list, kinds: set) -> list:
+    jobs = []
+    for path, kind in corpus:
+        if kind in kinds:
+            with open(path, "rb") as f:
+                jobs.append((os.path.basename(path), kind, f.read()))
+    return jobs
+
+
+async def run_extraction(args, corpus: list, recorder: Recorder) -> dict:
+    from app import bot
+
+    jobs = document_jobs(corpus, {"pdf", "docx"} | ({"image", "scanned_pdf"} if args.ocr else set()))
+    missing = defaultdict(int)
+    counter = itertools.count()
+
+    async def worker():
+        while (i := next(counter)) < args.requests:
+            name, kind, data = jobs[i % len(jobs)]
+            start = time.perf_counter()
+            try:
+                text = await bot.extraction_service.extract(data, EXTENSIONS[kind])
+                ok = MARKER in text.upper()
+            except Exception:
+                ok = False
+            recorder.record(f"extract:{kind}", time.perf_counter() - start, ok)
+            if not ok:
+                missing[name] += 1
+
+    bot.extraction_service.start()
+    try:
+        recorder.start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        recorder.end = time.perf_counter()
+    finally:
+        bot.extraction_service.shutdown()
+    return {"extraction_failures": dict(missing)}
+
+
+async def run_handlers(args, corpus: list, recorder: Recorder) -> dict:
+    from app import bot
+    from app.gemini_client import UNAVAILABLE_MESSAGE
+    from app.metrics import gemini_seconds
+
+    mock, base_url = (None, args.gemini_url) if args.gemini_url else start_mock_gemini(args)
+    bot.gemini_client.url = f"{base_url}:generateContent"
+    bot.gemini_client.stream_url = f"{base_url}:streamGenerateContent"
+
+    request = FakeTelegramRequest(latency=args.telegram_latency, flood_rate=args.telegram_flood, seed=args.seed)
+    application = bot.build_application(request=request)
+    handler_errors = []
+
+    async def count_error(update, context):
+        handler_errors.append(context.error)
+
+    application.add_error_handler(count_error)
+    await application.initialize()
+    await bot.on_startup(application)
+    updates = UpdateFactory(application.bot, request)
+
+    documents = document_jobs(corpus, {"pdf", "docx"} | ({"image", "scanned_pdf"} if args.ocr else set()))
+    rng = random.Random(args.seed)
+    counter = itertools.count()
+
+    def document_update(i: int, chat_id: int, index: int, suffix: str = ""):
+        name, doc_kind, data = documents[index % len(documents)]
+        # Unique file IDs so each upload is a cold extraction unless --repeat is given
+        file_id = f"{doc_kind}-{index % len(documents) if args.repeat else i}{suffix}"
+        if doc_kind == "image":
+            return updates.photo(chat_id, data, file_id)
+        return updates.document(chat_id, name, data, file_id)
+
+    def bundle_updates(i: int, chat_id: int):
+        # A case bundle: batch_size files, the last one a copy of the first (as a separate
+        # upload) so repeated-page removal gets exercised
+        picks = [i + n for n in range(args.batch_size - 1)] + [i]
+        if not args.zip:
+            return [document_update(i, chat_id, index, f"-{n}") for n, index in enumerate(picks)]
+        buffer = BytesIO()
+        with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+            for n, index in enumerate(picks):
+                name, _, data = documents[index % len(documents)]
+                archive.writestr(f"bundle/{n}_{name}", data)
+        return [updates.document(chat_id, "bundle.zip", buffer.getvalue(), f"zip-{i}")]
+
+    def next_updates(i: int, chat_id: int):
+        kind = args.scenario
+        if kind == "mixed":
+            kind = "document" if rng.random() < args.document_share else "text"
+        if kind == "batch":
+            return "batch:zip" if args.zip else "batch:files", bundle_updates(i, chat_id)
+        if kind == "document":
+            label = f"document:{documents[i % len(documents)][1]}"
+            return label, [document_update(i, chat_id, i)]
+        query = rng.choice(TEXT_QUERIES).format(n=rng.randrange(100) if args.repeat else i)
+        return "text", [updates.text(chat_id, query)]
+
+    async def user(chat_id: int):
+        # Closed loop: each simulated user sends its next message once the last one is answered
+        while (i := next(counter)) < args.requests:
+            label, batch = next_updates(i, chat_id)
+            errors = len(handler_errors)
+            start = time.perf_counter()
+            await asyncio.gather(*(application.process_update(update) for update in batch))
+            answered = request.last_text.get(chat_id, "")
+            ok = len(handler_errors) == errors and UNAVAILABLE_MESSAGE not in answered
+            recorder.record(label, time.perf_counter() - start, ok)
+
+    try:
+        recorder.start = time.perf_counter()
+        await asyncio.gather(*(user(10_000 + n) for n in range(args.concurrency)))
+        recorder.end = time.perf_counter()
+    finally:
+        await application.shutdown()
+        await bot.on_shutdown(application)
+        if mock is not None:
+            mock.terminate()
+    return {
+        "telegram_calls": dict(request.calls),
+        "gemini_calls": gemini_seconds.total(),
+        "response_cache": bot.response_cache.stats(),
+    }
+
+
+async def run(args) -> dict:
+    corpus = build_corpus(args.corpus)
+    recorder = Recorder()
+    sampler = asyncio.create_task(recorder.sample_memory())
+    try:
+        if args.scenario == "extract":
+            extra = await run_extraction(args, corpus, recorder)
+        else:
+            extra = await run_handlers(args, corpus, recorder)
+    finally:
+        sampler.cancel()
+    result = recorder.report()
+    result.update(extra)
+    result["scenario"] = args.scenario
+    result["concurrency"] = args.concurrency
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Offline load test for the Legal Tune bot")
+    parser.add_argument("--scenario", choices=["text", "document", "batch", "mixed", "extract"], default="text")
+    parser.add_argument("--concurrency", type=int, default=20, help="simulated users / parallel extractions")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--document-share", type=float, default=0.2, help="share of uploads in the mixed scenario")
+    parser.add_argument("--batch-size", type=int, default=4, help="files per bundle in the batch scenario")
+    parser.add_argument("--zip", action="store_true", help="send each bundle as one ZIP archive")
+    parser.add_argument("--repeat", action="store_true", help="reuse queries and files so caches get hits")
+    parser.add_argument("--ocr", action="store_true", help="include scanned documents (needs tesseract)")
+    parser.add_argument("--telegram-latency", type=float, default=0.05, help="fake Bot API round trip")
+    parser.add_argument("--telegram-flood", type=float, default=0.0,
+                        help="share of sends/edits refused with a 1s RetryAfter")
+    parser.add_argument("--gemini-url", help="use an already running mock, e.g. http://127.0.0.1:8765/v1/models/mock")
+    parser.add_argument("--corpus", default=DEFAULT_DIR)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="also write the results to this file")
+    parser.add_argument("--verbose", action="store_true", help="keep the bot's INFO logging")
+    mock_gemini.add_arguments(parser)
+    args = parser.parse_args()
+
+    import logging
+    if not args.verbose:
+        logging.disable(logging.INFO)
+
+    result = asyncio.run(run(args))
+    print_report(result)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2)
+    if result.get("extraction_failures"):
+        print(f"\nExtraction regressions: {result['extraction_failures']}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
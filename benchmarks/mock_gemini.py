@@ -0,0 +1,146 @@
+# Local stand-in for the Gemini REST API so benchmarks never touch the real service.
+# Serves :generateContent and :streamGenerateContent (?alt=sse) with configurable latency,
+# streaming pace and a share of injected 429s.
+#
+#   python benchmarks/mock_gemini.py --port 8765 --latency 0.8 --rate-limit 0.05
+
+import argparse
+import asyncio
+import json
+import logging
+import random
+
+logger = logging.getLogger(__name__)
+
+ANSWER = (
+    "**Summary**\n\nThis provision deals with cheating and dishonestly inducing delivery of property. "
+    "The offence is cognizable and non-bailable, and the punishment may extend to seven years.\n\n"
+    "**Key points**\n\n* The accused must have intended to deceive at the time of the promise.\n"
+    "* A mere breach of contract is not cheating.\n* The victim should file a complaint with the police.\n\n"
+    "**Example**\n\nA sells a plot he does not own and takes an advance of two lakh rupees."
+)
+
+
+class MockGemini:
+    def __init__(self, latency: float = 0.5, jitter: float = 0.2, rate_limit: float = 0.0,
+                 chunks: int = 8, chunk_delay: float = 0.05, seed: int = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit = rate_limit
+        self.chunks = chunks
+        self.chunk_delay = chunk_delay
+        self.random = random.Random(seed)
+        self.requests = 0
+        self.rate_limited = 0
+
+    def _delay(self) -> float:
+        return max(0.0, self.latency + self.random.uniform(-self.jitter, self.jitter))
+
+    def _answer(self, prompt: str) -> str:
+        # Echo a little of the prompt so coalescing/caching bugs show up as wrong answers
+        return f"{ANSWER}\n\n(prompt: {len(prompt)} chars)"
+
+    def _usage(self, request: dict, answer: str) -> dict:
+        # Rough stand-in for the real tokenizer: ~4 characters per token
+        texts = [part.get("text", "") for part in request.get("systemInstruction", {}).get("parts", [])]
+        texts += [part.get("text", "") for content in request["contents"] for part in content.get("parts", [])]
+        prompt = sum(len(text) for text in texts) // 4
+        output = len(answer) // 4
+        return {"promptTokenCount": prompt, "candidatesTokenCount": output, "totalTokenCount": prompt + output}
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            request_line = await reader.readline()
+            if not request_line:
+                return
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                name, _, value = line.decode().partition(":")
+                headers[name.strip().lower()] = value.strip()
+            body = await reader.readexactly(int(headers.get("content-length", 0)))
+            path = request_line.split()[1].decode()
+            self.requests += 1
+
+            if self.random.random() < self.rate_limit:
+                self.rate_limited += 1
+                await asyncio.sleep(0.01)
+                await self._respond(writer, "429 Too Many Requests", b'{"error": {"code": 429}}')
+                return
+
+            try:
+                prompt = json.loads(body)["contents"][0]["parts"][0]["text"]
+            except (ValueError, KeyError, IndexError):
+                await self._respond(writer, "400 Bad Request", b'{"error": {"code": 400}}')
+                return
+
+            await asyncio.sleep(self._delay())
+            answer = self._answer(prompt)
+            usage = self._usage(json.loads(body), answer)
+            if ":streamGenerateContent" in path:
+                await self._stream(writer, answer, usage)
+            else:
+                payload = {"candidates": [{"content": {"parts": [{"text": answer}]}}], "usageMetadata": usage}
+                await self._respond(writer, "200 OK", json.dumps(payload).encode())
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _respond(self, writer, status: str, body: bytes, content_type: str = "application/json") -> None:
+        writer.write(
+            f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+        )
+        await writer.drain()
+
+    async def _stream(self, writer, answer: str, usage: dict) -> None:
+        writer.write(
+            b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\n"
+            b"Transfer-Encoding: chunked\r\nConnection: close\r\n\r\n"
+        )
+        step = max(1, len(answer) // self.chunks)
+        for start in range(0, len(answer), step):
+            event = {"candidates": [{"content": {"parts": [{"text": answer[start:start + step]}]}}],
+                     "usageMetadata": usage}
+            data = f"data: {json.dumps(event)}\r\n\r\n".encode()
+            writer.write(b"%x\r\n" % len(data) + data + b"\r\n")
+            await writer.drain()
+            await asyncio.sleep(self.chunk_delay)
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+    async def serve(self, host: str = "127.0.0.1", port: int = 8765):
+        server = await asyncio.start_server(self.handle, host, port, backlog=1024)
+        logger.info(f"Mock Gemini listening on {host}:{port}")
+        return server
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--latency", type=float, default=0.5, help="mean seconds before the first byte")
+    parser.add_argument("--jitter", type=float, default=0.2)
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="share of requests answered with 429")
+    parser.add_argument("--chunks", type=int, default=8, help="SSE events per streamed answer")
+    parser.add_argument("--chunk-delay", type=float, default=0.05)
+
+
+async def _serve_forever(args) -> None:
+    mock = MockGemini(args.latency, args.jitter, args.rate_limit, args.chunks, args.chunk_delay)
+    server = await mock.serve(args.host, args.port)
+    async with server:
+        await server.serve_forever()
+
+
+def main() -> None:
+    logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Mock Gemini API server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    add_arguments(parser)
+    asyncio.run(_serve_forever(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+# Cold-start check: how long a fresh process takes to import app.bot and to run the
+# application's startup hook, and which heavy modules got imported eagerly. Each run is a
+# new interpreter, like a restarted worker or a new webhook instance.
+#
+#   python benchmarks/startup.py --runs 5
+#   python benchmarks/startup.py --budget 0.5 --importtime   # exits 1 on regression
+#
+# Exits non-zero if the median import time is over --budget seconds or if any of the
+# lazily loaded extraction libraries were imported, so it can run as a pre-deploy gate.
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Only extraction workers (or the legacy sync client) should ever load these
+LAZY_MODULES = ("pdfplumber", "docx", "PIL", "pytesseract", "requests")
+
+PROBE = """
+import asyncio, json, sys, time
+sys.path[:0] = [{root!r}, {bench!r}]
+start = time.perf_counter()
+from app import bot
+imported = time.perf_counter() - start
+eager = [name for name in {lazy!r} if name in sys.modules]
+
+from fake_telegram import FakeTelegramRequest
+
+async def start_app():
+    application = bot.build_application(request=FakeTelegramRequest(latency=0))
+    begin = time.perf_counter()
+    await application.initialize()
+    await bot.on_startup(application)
+    ready = time.perf_counter() - begin
+    await application.shutdown()
+    await bot.on_shutdown(application)
+    return ready
+
+ready = asyncio.run(start_app())
+print(json.dumps({{"import": imported, "startup": ready, "eager": eager}}))
+"""
+
+
+def probe_env() -> dict:
+    # Same offline settings as the load test: no real keys, no metrics port, nothing on disk
+    env = dict(os.environ)
+    env.setdefault("GEMINI_API_KEY", "benchmark")
+    env.setdefault("TELEGRAM_BOT_TOKEN", "123456:benchmark")
+    env.setdefault("METRICS_PORT", "0")
+    env.setdefault("RESPONSE_CACHE_DB", "")
+    env.setdefault("SESSION_DB", ":memory:")
+    env.setdefault("EXTRACTION_WORKERS", "2")
+    return env
+
+
+def run_probe() -> dict:
+    code = PROBE.format(root=ROOT, bench=BENCH_DIR, lazy=LAZY_MODULES)
+    output = subprocess.run(
+        [sys.executable, "-c", code], env=probe_env(), capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def slowest_imports(limit: int = 15) -> list:
+    # (cumulative microseconds, module) from -X importtime, slowest first
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "from app import bot"],
+        env=probe_env(), cwd=ROOT, capture_output=True, text=True,
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        parts = line.split("|")
+        if len(parts) == 3 and parts[1].strip().isdigit():
+            rows.append((int(parts[1]), parts[2].rstrip()))
+    return sorted(rows, reverse=True)[:limit]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Cold-start timing for the Legal Tune bot")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget", type=float, default=0.6, help="max median seconds to import app.bot")
+    parser.add_argument("--importtime", action="store_true", help="also list the slowest imports")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    runs = [run_probe() for _ in range(args.runs)]
+    result = {
+        "import_median": statistics.median(r["import"] for r in runs),
+        "import_max": max(r["import"] for r in runs),
+        "startup_median": statistics.median(r["startup"] for r in runs),
+        "eager_imports": sorted({name for r in runs for name in r["eager"]}),
+        "budget": args.budget,
+    }
+
+    print(f"import app.bot: median {result['import_median']:.3f}s, max {result['import_max']:.3f}s "
+          f"(budget {args.budget:.3f}s)")
+    print(f"startup hook:   median {result['startup_median']:.3f}s")
+    if args.importtime:
+        print("\nslowest imports (cumulative):")
+        for micros, name in slowest_imports():
+            print(f"  {micros / 1e6:8.3f}s  {name}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2)
+
+    failures = []
+    if result["import_median"] > args.budget:
+        failures.append(f"import time {result['import_median']:.3f}s is over the {args.budget:.3f}s budget")
+    if result["eager_imports"]:
+        failures.append(f"imported at startup: {', '.join(result['eager_imports'])}")
+    if failures:
+        print("\nStartup regressions: " + "; ".join(failures))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,3 @@
-
 import os
 from dotenv import load_dotenv
 
@@ -7,7 +6,118 @@ load_dotenv()
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 
-if not GEMINI_API_KEY:
-    raise ValueError("GEMINI_API_KEY not found in .env")
-if not TELEGRAM_BOT_TOKEN:
-    raise ValueError("TELEGRAM_BOT_TOKEN not found in .env")
+# Async Gemini client: max simultaneous API calls and size of the keep-alive pool
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "8"))
+GEMINI_MAX_CONNECTIONS = int(os.getenv("GEMINI_MAX_CONNECTIONS", "20"))
+# Account quota enforced by the request scheduler (requests and tokens per minute)
+GEMINI_RPM = int(os.getenv("GEMINI_RPM", "60"))
+GEMINI_TPM = int(os.getenv("GEMINI_TPM", "1000000"))
+# Per-chat limits: questions in flight (older ones are cancelled) and documents processed at once
+CHAT_MAX_IN_FLIGHT = int(os.getenv("CHAT_MAX_IN_FLIGHT", "1"))
+CHAT_MAX_DOCUMENTS = int(os.getenv("CHAT_MAX_DOCUMENTS", "1"))
+
+# User session store shared by polling mode and webhook workers
+SESSION_DB = os.getenv("SESSION_DB", "sessions.db")
+# Seconds between batched session writes, and idle time before a session leaves memory
+SESSION_FLUSH_INTERVAL = int(os.getenv("SESSION_FLUSH_INTERVAL", "30"))
+SESSION_IDLE_TTL = int(os.getenv("SESSION_IDLE_TTL", "1800"))
+
+# Offline statute index; bare section lookups ("IPC 420") are answered from it directly
+STATUTE_INDEX_PATH = os.getenv(
+    "STATUTE_INDEX_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "statutes.jsonl")
+)
+STATUTE_DIRECT_ANSWERS = os.getenv("STATUTE_DIRECT_ANSWERS", "true").lower() == "true"
+
+# Prometheus-style /metrics endpoint (0 disables it). Webhook workers use METRICS_PORT + n.
+# It has no authentication, so it only listens locally unless METRICS_HOST says otherwise
+# (e.g. 0.0.0.0 for a scraper on another host).
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9100"))
+
+# Webhook mode (python -m app.webhook): public URL Telegram posts to, listen address,
+# shared secret checked on every request and number of worker processes
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8443"))
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", str(os.cpu_count() or 2)))
+
+# Response cache for repeat questions; set RESPONSE_CACHE_DB to a file path to persist it
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "1000"))
+RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", "86400"))
+RESPONSE_CACHE_DB = os.getenv("RESPONSE_CACHE_DB", "")
+
+# Uploaded document cache (memory only, purged after the TTL to honour the privacy policy)
+DOCUMENT_CACHE_MAX_BYTES = int(os.getenv("DOCUMENT_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+DOCUMENT_CACHE_TTL = int(os.getenv("DOCUMENT_CACHE_TTL", "1800"))
+
+# Worker pool for PDF/DOCX/OCR extraction
+EXTRACTION_WORKERS = int(os.getenv("EXTRACTION_WORKERS", str(os.cpu_count() or 2)))
+EXTRACTION_MAX_PENDING = int(os.getenv("EXTRACTION_MAX_PENDING", "16"))
+EXTRACTION_TIMEOUT = int(os.getenv("EXTRACTION_TIMEOUT", "120"))
+# Stop extracting once this many characters are collected; large PDFs are split into page ranges
+EXTRACTION_MAX_CHARS = int(os.getenv("EXTRACTION_MAX_CHARS", "1000000"))
+PDF_PAGES_PER_JOB = int(os.getenv("PDF_PAGES_PER_JOB", "10"))
+
+# Upload limits, checked before downloading (Telegram bots can't download over 20 MB anyway)
+UPLOAD_MAX_BYTES_PDF = int(os.getenv("UPLOAD_MAX_BYTES_PDF", str(20 * 1024 * 1024)))
+UPLOAD_MAX_BYTES_DOCX = int(os.getenv("UPLOAD_MAX_BYTES_DOCX", str(10 * 1024 * 1024)))
+UPLOAD_MAX_BYTES_IMAGE = int(os.getenv("UPLOAD_MAX_BYTES_IMAGE", str(10 * 1024 * 1024)))
+UPLOAD_MAX_BYTES_TEXT = int(os.getenv("UPLOAD_MAX_BYTES_TEXT", str(2 * 1024 * 1024)))
+UPLOAD_MAX_BYTES_ZIP = int(os.getenv("UPLOAD_MAX_BYTES_ZIP", str(20 * 1024 * 1024)))
+UPLOAD_MAX_PDF_PAGES = int(os.getenv("UPLOAD_MAX_PDF_PAGES", "300"))
+# Uploads above this size are spooled to a temp file instead of kept in memory
+UPLOAD_SPOOL_BYTES = int(os.getenv("UPLOAD_SPOOL_BYTES", str(1024 * 1024)))
+UPLOAD_TMP_DIR = os.getenv("UPLOAD_TMP_DIR") or None
+# Total size of uploads being downloaded/extracted at once, per process
+UPLOAD_MAX_IN_FLIGHT_BYTES = int(os.getenv("UPLOAD_MAX_IN_FLIGHT_BYTES", str(64 * 1024 * 1024)))
+
+# Batch mode: files a chat sends within BATCH_WINDOW seconds of each other (or a ZIP) are
+# analyzed together as one case bundle. 0 only groups files that arrive at the same moment.
+BATCH_WINDOW = float(os.getenv("BATCH_WINDOW", "3"))
+BATCH_MAX_FILES = int(os.getenv("BATCH_MAX_FILES", "20"))
+# Cap on the unpacked size of a ZIP's contents
+BATCH_MAX_BYTES = int(os.getenv("BATCH_MAX_BYTES", str(64 * 1024 * 1024)))
+# Files of one batch extracted at the same time
+BATCH_MAX_PARALLEL = int(os.getenv("BATCH_MAX_PARALLEL", "4"))
+
+# OCR for photos and scanned PDFs
+OCR_DPI = int(os.getenv("OCR_DPI", "200"))
+OCR_MAX_DIMENSION = int(os.getenv("OCR_MAX_DIMENSION", "3000"))
+OCR_TIME_BUDGET = int(os.getenv("OCR_TIME_BUDGET", "60"))
+
+# Long documents are summarized chunk by chunk, then merged
+ANALYSIS_CHUNK_CHARS = int(os.getenv("ANALYSIS_CHUNK_CHARS", "12000"))
+ANALYSIS_MAX_PARALLEL = int(os.getenv("ANALYSIS_MAX_PARALLEL", "4"))
+
+# Follow-up questions on uploaded documents: excerpts are kept in memory for the TTL and
+# the TOP_K best-matching chunks are sent with each question
+DOC_SESSION_TTL = int(os.getenv("DOC_SESSION_TTL", "1800"))
+DOC_SESSION_MAX_BYTES = int(os.getenv("DOC_SESSION_MAX_BYTES", str(32 * 1024 * 1024)))
+DOC_SESSION_CHUNK_CHARS = int(os.getenv("DOC_SESSION_CHUNK_CHARS", "1500"))
+DOC_SESSION_TOP_K = int(os.getenv("DOC_SESSION_TOP_K", "4"))
+
+# Prompt budgets in estimated tokens (~4 characters each): document text in a single-call
+# summary, retrieved excerpts for a follow-up question, statute references for an explanation
+PROMPT_BUDGET_DOCUMENT = int(os.getenv("PROMPT_BUDGET_DOCUMENT", "12000"))
+PROMPT_BUDGET_QUESTION = int(os.getenv("PROMPT_BUDGET_QUESTION", "3000"))
+PROMPT_BUDGET_REFERENCES = int(os.getenv("PROMPT_BUDGET_REFERENCES", "2000"))
+
+# Outgoing Telegram messages: per-bot and per-chat send rates (Telegram allows about 30
+# messages a second overall and one a second per chat, with short bursts)
+TELEGRAM_GLOBAL_RATE = float(os.getenv("TELEGRAM_GLOBAL_RATE", "25"))
+TELEGRAM_CHAT_RATE = float(os.getenv("TELEGRAM_CHAT_RATE", "1"))
+TELEGRAM_CHAT_BURST = int(os.getenv("TELEGRAM_CHAT_BURST", "3"))
+
+# Stream answers into Telegram as they are generated; edits are throttled to this interval
+STREAM_RESPONSES = os.getenv("STREAM_RESPONSES", "true").lower() == "true"
+STREAM_EDIT_INTERVAL = float(os.getenv("STREAM_EDIT_INTERVAL", "1.5"))
+
+
+def check_credentials() -> None:
+    # Called when the bot is built rather than on import, so tools and benchmarks can
+    # import the settings without API keys
+    if not GEMINI_API_KEY:
+        raise ValueError("GEMINI_API_KEY not found in .env")
+    if not TELEGRAM_BOT_TOKEN:
+        raise ValueError("TELEGRAM_BOT_TOKEN not found in .env")
@@ -0,0 +1,22 @@
+import asyncio
+
+from app.analysis import DocumentAnalyzer
+from app.document_processor import PAGE_BREAK
+from app.gemini_client import UNAVAILABLE_MESSAGE
+
+
+class FlakyClient:
+    # Chunk 2 fails the way the real client does: it returns the fallback text
+    async def summarize_chunk(self, text, doc_type, index, total):
+        return UNAVAILABLE_MESSAGE if index == 2 else f"summary {index}"
+
+    async def merge_summaries(self, summaries, doc_type, language=None):
+        return " | ".join(summaries)
+
+
+def test_failed_chunks_are_reported():
+    text = PAGE_BREAK.join(f"page {i} " + "x" * 90 for i in range(3))
+    analyzer = DocumentAnalyzer(FlakyClient(), chunk_chars=100)
+    summary, skipped = asyncio.run(analyzer.analyze(text))
+    assert summary == "summary 1 | summary 3"
+    assert skipped == 1
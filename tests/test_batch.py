@@ -0,0 +1,33 @@
+import asyncio
+
+from app.batch import BatchCollector, BatchItem, merge_documents
+from app.document_processor import PAGE_BREAK
+
+
+def item(name):
+    return BatchItem(name, name, name, ".pdf", 100)
+
+
+def test_senders_in_one_chat_get_separate_batches():
+    async def scenario():
+        collector = BatchCollector(window=0.05)
+        first, first_leader = collector.join((1, 10), item("fir.pdf"))
+        second, second_leader = collector.join((1, 20), item("lease.pdf"))
+        third, third_leader = collector.join((1, 10), item("order.pdf"))
+        return (first_leader, second_leader, third_leader, third is first,
+                await collector.collect((1, 10), first), await collector.collect((1, 20), second))
+
+    leaders_a, leader_b, leader_c, same, items_a, items_b = asyncio.run(scenario())
+    assert leaders_a and leader_b and not leader_c and same
+    assert [i.file_name for i in items_a] == ["fir.pdf", "order.pdf"]
+    assert [i.file_name for i in items_b] == ["lease.pdf"]
+
+
+def test_merge_documents_drops_repeated_pages():
+    text, duplicates = merge_documents([
+        ("fir.pdf", f"FIR page one{PAGE_BREAK}FIR page two"),
+        ("chargesheet.pdf", f"Chargesheet{PAGE_BREAK}fir  PAGE one"),
+    ])
+    assert duplicates == 1
+    assert text.count("page one") == 1
+    assert "=== Document 2: chargesheet.pdf ===" in text
@@ -0,0 +1,66 @@
+import asyncio
+
+from app import cache as cache_module
+from app.cache import DocumentCache, ResponseCache, SQLiteCacheBackend
+
+
+def test_disk_tier_survives_a_new_cache(tmp_path):
+    path = str(tmp_path / "responses.db")
+    cache = ResponseCache(db_path=path)
+    asyncio.run(cache.set("IPC 420?", "Cheating.", template="explanation"))
+    cache.close()
+
+    reopened = ResponseCache(db_path=path)
+    assert asyncio.run(reopened.get("ipc 420", template="explanation")) == "Cheating."
+    assert reopened.hits == 1
+    reopened.close()
+
+
+def test_prune_drops_least_recently_used(tmp_path):
+    disk = SQLiteCacheBackend(str(tmp_path / "responses.db"), max_size=3)
+    disk.PRUNE_EVERY = 1
+    for key in ("a", "b", "c"):
+        disk.set(key, key, ttl=60)
+    assert disk.get("a") == "a"  # touched, so "b" is now the oldest
+    disk.set("d", "d", ttl=60)
+    assert disk.get("b") is None
+    assert [disk.get(key) for key in ("a", "c", "d")] == ["a", "c", "d"]
+    disk.close()
+
+
+def test_document_cache_evicts_oldest_within_byte_bound():
+    documents = DocumentCache(max_bytes=25)
+    documents.put_text("a", "x" * 10, "file-a")
+    documents.put_text("b", "y" * 10, "file-b")
+    assert documents.get_text("a") == "x" * 10  # "b" is now the least recently used
+    documents.put_text("c", "z" * 10, "file-c")
+
+    assert documents.get_text("b") is None
+    assert documents.resolve("file-b") is None  # its alias goes with it
+    assert documents.resolve("file-a") == "a"
+    assert documents.stats()["bytes"] == 20
+
+
+def test_document_summaries_count_towards_the_bound():
+    documents = DocumentCache(max_bytes=25)
+    documents.put_text("a", "x" * 10)
+    documents.put_text("b", "y" * 10)
+    documents.put_summary("b", "s" * 10, "Hindi")
+    assert documents.get_text("a") is None
+    assert documents.get_summary("b", "hindi") == "s" * 10
+    assert documents.stats()["bytes"] == 20
+
+
+def test_document_cache_purges_expired_entries(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache_module.time, "time", lambda: now[0])
+    documents = DocumentCache(ttl=60)
+    documents.put_text("a", "old text", "file-a")
+    now[0] += 30
+    documents.put_text("b", "new text", "file-b")
+    now[0] += 45
+
+    assert documents.purge_expired() == 1
+    assert documents.resolve("file-a") is None
+    assert documents.get_text("b") == "new text"
+    assert documents.stats()["bytes"] == len("new text")
@@ -0,0 +1,97 @@
+import asyncio
+
+from app.concurrency import ChatLimiter, ChatUpdateProcessor, release_turn
+
+
+def test_newer_message_only_supersedes_the_same_sender():
+    async def scenario():
+        limiter = ChatLimiter(max_in_flight=1)
+        started = asyncio.Event()
+
+        async def ask(key, wait):
+            with limiter.supersede(key):
+                started.set()
+                await asyncio.sleep(wait)
+                return key
+
+        first = asyncio.create_task(ask((1, 10), 0.1))
+        await started.wait()
+        other_member = asyncio.create_task(ask((1, 20), 0.01))
+        await other_member
+        assert not first.cancelled() and not first.done()
+        same_member = asyncio.create_task(ask((1, 10), 0.01))
+        await same_member
+        await asyncio.gather(first, return_exceptions=True)
+        return first.cancelled(), limiter.superseded
+
+    cancelled, superseded = asyncio.run(scenario())
+    assert cancelled and superseded == 1
+
+
+def test_updates_from_one_chat_run_in_order():
+    class Chat:
+        def __init__(self, chat_id):
+            self.id = chat_id
+
+    class FakeUpdate:
+        def __init__(self, chat_id):
+            self.effective_chat = Chat(chat_id)
+
+    events = []
+
+    async def handler(name, delay, release=False):
+        events.append(f"{name} start")
+        if release:
+            release_turn()
+        await asyncio.sleep(delay)
+        events.append(f"{name} end")
+
+    async def scenario():
+        processor = ChatUpdateProcessor()
+        await asyncio.gather(
+            processor.process_update(FakeUpdate(1), handler("a1", 0.02)),
+            processor.process_update(FakeUpdate(1), handler("a2", 0)),
+            processor.process_update(FakeUpdate(2), handler("b1", 0)),
+        )
+        assert not processor._chats
+        # A handler that released its turn lets the chat's next update start early
+        await asyncio.gather(
+            processor.process_update(FakeUpdate(1), handler("c1", 0.02, release=True)),
+            processor.process_update(FakeUpdate(1), handler("c2", 0)),
+        )
+
+    asyncio.run(scenario())
+    assert events[:6] == ["a1 start", "b1 start", "b1 end", "a1 end", "a2 start", "a2 end"]
+    assert events[6:] == ["c1 start", "c2 start", "c2 end", "c1 end"]
+
+
+def test_backlog_in_one_chat_does_not_hold_global_slots():
+    class Chat:
+        def __init__(self, chat_id):
+            self.id = chat_id
+
+    class FakeUpdate:
+        def __init__(self, chat_id):
+            self.effective_chat = Chat(chat_id)
+
+    async def scenario():
+        loop = asyncio.get_running_loop()
+        processor = ChatUpdateProcessor(max_concurrent_updates=4)
+        started = {}
+
+        async def handler(name, delay):
+            started[name] = loop.time()
+            await asyncio.sleep(delay)
+
+        begin = loop.time()
+        backlog = [
+            asyncio.ensure_future(processor.process_update(FakeUpdate(1), handler(f"a{i}", 0.05)))
+            for i in range(8)
+        ]
+        await asyncio.sleep(0)
+        await processor.process_update(FakeUpdate(2), handler("b", 0))
+        waited = started["b"] - begin
+        await asyncio.gather(*backlog)
+        return waited
+
+    assert asyncio.run(scenario()) < 0.05
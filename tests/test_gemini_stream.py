@@ -0,0 +1,44 @@
+import asyncio
+import json
+
+import httpx
+
+from app.cache import ResponseCache
+from app.gemini_client import AsyncGeminiClient, StreamInterrupted
+
+
+class BrokenStream(httpx.AsyncByteStream):
+    # One SSE event, then the connection drops
+    async def __aiter__(self):
+        event = {"candidates": [{"content": {"parts": [{"text": "Section 420 deals with"}]}}]}
+        yield f"data: {json.dumps(event)}\n\n".encode()
+        raise httpx.ReadError("connection reset")
+
+
+def broken_client(cache):
+    client = AsyncGeminiClient(cache=cache)
+    client._http = httpx.AsyncClient(
+        transport=httpx.MockTransport(lambda request: httpx.Response(200, stream=BrokenStream()))
+    )
+    return client
+
+
+def test_interrupted_stream_is_not_cached_or_shared():
+    async def scenario():
+        cache = ResponseCache()
+        client = broken_client(cache)
+        received = []
+        interrupted = False
+        try:
+            async for delta in client.stream_legal_explanation("IPC 420"):
+                received.append(delta)
+        except StreamInterrupted:
+            interrupted = True
+        await client.aclose()
+        return cache, client, received, interrupted
+
+    cache, client, received, interrupted = asyncio.run(scenario())
+    assert received == ["Section 420 deals with"]
+    assert interrupted
+    assert asyncio.run(cache.get("IPC 420", None, template="explanation")) is None
+    assert not client.coalescer._inflight
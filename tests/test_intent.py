@@ -0,0 +1,42 @@
+from app.intent import StatuteRef, classify, is_bare_reference
+
+
+def test_statute_references_in_common_forms():
+    assert classify("IPC 420").entities == [StatuteRef("IPC", "420")]
+    assert classify("Explain section 138 of the NI Act").entities == [StatuteRef("NI Act", "138")]
+    assert classify("u/s 498A IPC meaning").entities == [StatuteRef("IPC", "498A")]
+    assert classify("IPC section 420").entities == [StatuteRef("IPC", "420")]
+    assert classify("What is Article 21?").entities == [StatuteRef("Constitution", "21")]
+    assert classify("Section 302").entities == [StatuteRef(None, "302")]
+
+
+def test_intents():
+    assert classify("IPC 420").intent == "explain_law"
+    assert classify("What are the weaknesses in my case").intent == "case_assist"
+    assert classify("Hindi").intent == "change_lang"
+    # A language named inside a longer question is not a language switch
+    assert classify("Explain IPC 420 in Hindi").intent == "explain_law"
+    assert classify("What is bail?").intent == "faq"
+    assert classify(
+        "My employer has not paid my salary for four months and keeps making excuses every week"
+    ).intent == "general_query"
+
+
+def test_keywords_match_whole_words_only():
+    # "act" inside "contract"/"fact", "sec" inside "secure", "win" inside "window"
+    result = classify("I signed a contract to secure the window fact")
+    assert result.scores == {"explain_law": 0.0, "case_assist": 0.0, "change_lang": 0.0}
+    assert not result.entities
+
+
+def test_code_names_do_not_count_their_words_as_keywords():
+    # "act" in "Evidence Act" is part of the code name, not a keyword of its own
+    assert classify("evidence act").scores["explain_law"] == 0.0
+    assert classify("the act").scores["explain_law"] == 1.0
+
+
+def test_bare_reference():
+    assert is_bare_reference("Explain section 302")
+    assert is_bare_reference("What is IPC 420?")
+    assert not is_bare_reference("Is IPC 420 bailable?")
+    assert not is_bare_reference("explain the IPC")
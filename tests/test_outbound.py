@@ -0,0 +1,74 @@
+import asyncio
+
+from app.outbound import OutboundSender, split_point, split_text, to_html
+
+
+class RecordingBot:
+    def __init__(self):
+        self.calls = []
+
+    async def send_message(self, **kwargs):
+        self.calls.append(kwargs)
+        return len(self.calls)
+
+
+def test_markdown_send_keeps_parse_mode_and_puts_keyboard_last():
+    bot = RecordingBot()
+    sender = OutboundSender(global_rate=1000, chat_rate=1000, chat_burst=10, max_length=25)
+    text = "*Welcome* to the bot.\n\nPick an option below."
+    messages = asyncio.run(sender.send(bot, 1, text, html=False, parse_mode="Markdown", reply_markup="keyboard"))
+
+    assert messages == [1, 2]
+    assert [call["parse_mode"] for call in bot.calls] == ["Markdown", "Markdown"]
+    assert "reply_markup" not in bot.calls[0]
+    assert bot.calls[1]["reply_markup"] == "keyboard"
+    assert bot.calls[0]["text"] == "*Welcome* to the bot."
+
+
+def test_cancelled_waiter_does_not_pin_the_chat():
+    class SlowBot(RecordingBot):
+        async def send_message(self, **kwargs):
+            await asyncio.sleep(0.02)
+            return await super().send_message(**kwargs)
+
+    async def scenario():
+        bot = SlowBot()
+        sender = OutboundSender(global_rate=1000, chat_rate=1000, chat_burst=10)
+        first = asyncio.ensure_future(sender.send(bot, 1, "first"))
+        await asyncio.sleep(0)
+        second = asyncio.ensure_future(sender.send(bot, 1, "second"))
+        await asyncio.sleep(0)
+        second.cancel()
+        await first
+        await asyncio.sleep(0.01)
+        return sender
+
+    sender = asyncio.run(scenario())
+    assert sender._chats == {}
+
+
+def test_to_html_converts_markers_and_escapes():
+    assert to_html("**Bold** and *italic*") == "<b>Bold</b> and <i>italic</i>"
+    assert to_html("a < b & c > d") == "a &lt; b &amp; c &gt; d"
+    assert to_html("**x < y**") == "<b>x &lt; y</b>"
+    # Unpaired or spaced markers stay literal
+    assert to_html("5 * 3 and **open") == "5 * 3 and **open"
+
+
+def test_split_point_prefers_paragraphs_and_avoids_bold_spans():
+    text = "First paragraph here.\n\nSecond one follows."
+    assert split_point(text, 30) == text.index("\n\n")
+    assert split_point("short", 30) == 5
+    # The only paragraph break is inside **...**, so the split falls back to a sentence end
+    text = "A longer intro sentence here. **Bold start\n\nbold end** tail"
+    cut = split_point(text, 45)
+    assert text[:cut] == "A longer intro sentence here."
+    # No break in the second half: hard cut
+    assert split_point("x" * 50, 20) == 20
+
+
+def test_split_text_keeps_all_words():
+    text = "One two three. Four five six.\n\nSeven eight nine ten."
+    chunks = split_text(text, 20)
+    assert all(len(chunk) <= 20 for chunk in chunks)
+    assert " ".join(chunks).split() == text.split()
@@ -0,0 +1,26 @@
+import asyncio
+
+from app.persistence import SQLitePersistence
+
+
+def test_session_is_read_once_per_user(tmp_path):
+    path = str(tmp_path / "sessions.db")
+
+    async def scenario():
+        writer = SQLitePersistence(path)
+        await writer.update_user_data(7, {"language": "Hindi", "debounce": 1})
+        await writer.flush()
+
+        reader = SQLitePersistence(path)
+        first = {}
+        await reader.refresh_user_data(7, first)
+        # Later refreshes keep the in-memory copy instead of reading the store again
+        await writer.update_user_data(7, {"language": "Tamil"})
+        await writer.flush()
+        later = {"language": "Hindi"}
+        await reader.refresh_user_data(7, later)
+        return first, later
+
+    first, later = asyncio.run(scenario())
+    assert first == {"language": "Hindi"}
+    assert later == {"language": "Hindi"}
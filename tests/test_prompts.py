@@ -0,0 +1,40 @@
+from app.document_processor import PAGE_BREAK
+from app.prompts import strip_boilerplate
+
+BODIES = [
+    ["The petitioner filed the suit in 2019.", "Summons were served on the respondent.",
+     "The respondent did not appear.", "An ex parte decree followed.", "The decree was challenged."],
+    ["The appeal was admitted on notice.", "Notice was served.", "3", "Counsel for both sides were heard.",
+     "4", "Written submissions were filed.", "Judgment was reserved."],
+    ["The trial court relied on two witnesses.", "Both witnesses were cross-examined.",
+     "Their accounts differ on the date.", "The documents were not produced.", "No expert was called."],
+    ["For these reasons the appeal succeeds.", "The decree is set aside.", "The suit is remanded.",
+     "Costs are left to the parties.", "Ordered accordingly."],
+]
+
+
+def page(number, lines):
+    return "\n".join([f"HIGH COURT OF DELHI — page {number}", "", *lines, "", f"- {number} -"])
+
+
+def test_running_headers_and_page_numbers_are_dropped():
+    text = PAGE_BREAK.join(page(n, lines) for n, lines in enumerate(BODIES, start=1))
+    pages = strip_boilerplate(text).split(PAGE_BREAK)
+    assert pages == ["\n".join(lines) for lines in BODIES]
+
+
+def test_numbered_paragraphs_in_the_body_survive():
+    text = PAGE_BREAK.join(page(n, lines) for n, lines in enumerate(BODIES, start=1))
+    assert "\n3\nCounsel" in strip_boilerplate(text)
+
+
+def test_whitespace_runs_are_collapsed():
+    text = PAGE_BREAK.join(page(n, lines) for n, lines in enumerate(BODIES, start=1))
+    text = text.replace("Summons were served", "Summons   were\tserved")
+    assert "Summons were served on the respondent." in strip_boilerplate(text)
+
+
+def test_short_documents_keep_their_first_lines():
+    # Fewer than three pages: nothing counts as a running header
+    text = PAGE_BREAK.join(["Title\nBody one", "Title\nBody two"])
+    assert strip_boilerplate(text) == text
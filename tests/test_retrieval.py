@@ -0,0 +1,16 @@
+from app.document_processor import PAGE_BREAK
+from app.retrieval import DocumentSessionStore
+
+
+def test_added_document_is_searchable():
+    store = DocumentSessionStore(chunk_chars=60)
+    text = PAGE_BREAK.join([
+        "The tenant paid a security deposit of two months rent.",
+        "The landlord refused to return the deposit after vacating.",
+        "Notice was served by registered post on 3 March.",
+    ])
+    store.add_document(1, "lease.pdf", text)
+    assert store.has_session(1)
+    hits = store.retrieve(1, "When was the notice served?", k=1)
+    assert hits == [("lease.pdf", "Notice was served by registered post on 3 March.")]
+    assert store.retrieve(2, "notice") == []
@@ -0,0 +1,36 @@
+from app import scheduler
+from app.scheduler import TokenBucket
+
+
+class Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_token_bucket_refills_at_its_rate(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(scheduler.time, "monotonic", clock)
+    bucket = TokenBucket(rate=2, capacity=4)
+
+    assert bucket.wait_time(4) == 0
+    bucket.consume(4)
+    assert bucket.wait_time(1) == 0.5
+    clock.now += 0.5
+    assert bucket.wait_time(1) == 0
+    # Never refills past capacity, and a request larger than capacity waits for a full bucket
+    clock.now += 60
+    bucket._refill()
+    assert bucket.tokens == 4
+    bucket.consume(3)
+    assert bucket.wait_time(10) == 1.5
+
+
+def test_drain_empties_the_bucket(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(scheduler.time, "monotonic", clock)
+    bucket = TokenBucket(rate=1, capacity=3)
+    bucket.drain()
+    assert bucket.wait_time(1) == 1.0
@@ -0,0 +1,45 @@
+import pytest
+
+from app.statutes import StatuteIndex, is_direct_lookup
+from config import STATUTE_INDEX_PATH
+
+
+@pytest.fixture(scope="module")
+def index():
+    statutes = StatuteIndex(STATUTE_INDEX_PATH)
+    yield statutes
+    statutes.close()
+
+
+@pytest.mark.parametrize("text", ["IPC 420", "Explain section 138 of the NI Act", "What is Article 21?", "u/s 498A IPC"])
+def test_bare_references_are_answered_directly(index, text):
+    assert is_direct_lookup(text, index.resolve(text))
+
+
+@pytest.mark.parametrize("text", ["Is IPC 420 bailable?", "IPC 302 bail possible?", "Can I get bail under IPC 406"])
+def test_questions_about_a_section_go_to_gemini(index, text):
+    entries = index.resolve(text)
+    assert entries
+    assert not is_direct_lookup(text, entries)
+
+
+def test_section_without_code_names_the_assumed_code(index):
+    entries = index.resolve("Section 482")
+    assert [entry.label for entry in entries] == ["Section 482 BNSS"]
+    assert entries[0].assumed
+    assert "assumes the BNSS" in entries[0].to_answer()
+
+
+def test_section_in_several_codes_is_not_answered_directly(tmp_path):
+    path = tmp_path / "statutes.jsonl"
+    path.write_text(
+        '{"code": "IPC", "section": "420", "title": "Cheating", "text": "Whoever cheats..."}\n'
+        '{"code": "BNS", "section": "420", "title": "Something else", "text": "Whoever..."}\n'
+    )
+    statutes = StatuteIndex(str(path))
+    try:
+        entries = statutes.resolve("Section 420")
+        assert len(entries) == 2 and all(entry.ambiguous for entry in entries)
+        assert not is_direct_lookup("Section 420", entries)
+    finally:
+        statutes.close()
@@ -0,0 +1,36 @@
+import asyncio
+from types import SimpleNamespace
+
+from app import bot
+
+
+class RecordingOutbound:
+    def __init__(self):
+        self.edits = []
+
+    async def edit(self, tg_bot, chat_id, message_id, text, html=False):
+        self.edits.append((asyncio.get_running_loop().time(), text))
+
+
+def test_first_delta_is_shown_without_waiting_for_the_edit_interval(monkeypatch):
+    outbound = RecordingOutbound()
+    monkeypatch.setattr(bot, "outbound", outbound)
+
+    async def deltas():
+        yield "Section 420 deals with"
+        await asyncio.sleep(0.05)
+        yield " cheating."
+
+    async def scenario():
+        update = SimpleNamespace(effective_chat=SimpleNamespace(id=1))
+        context = SimpleNamespace(bot=None)
+        start = asyncio.get_running_loop().time()
+        await bot.stream_reply(update, context, SimpleNamespace(message_id=5), deltas())
+        return start
+
+    start = asyncio.run(scenario())
+    first_at, first_text = outbound.edits[0]
+    assert first_text == "Section 420 deals with ✍️"
+    assert first_at - start < 0.05
+    # The final edit carries the whole answer
+    assert outbound.edits[-1][1].startswith("Section 420 deals with cheating.")
@@ -0,0 +1,70 @@
+import asyncio
+import os
+
+import pytest
+
+from app.uploads import UploadBudgetExceeded, UploadManager, UploadRejected
+
+MB = 2**20
+
+
+def manager(tmp_path, max_in_flight=10 * MB):
+    return UploadManager({"pdf": 5 * MB, "image": 1 * MB}, max_in_flight, spool_bytes=1024, tmp_dir=str(tmp_path))
+
+
+def test_check_applies_per_format_limits(tmp_path):
+    uploads = manager(tmp_path)
+    uploads.check(".PDF", 4 * MB)
+    with pytest.raises(UploadRejected, match="limit for PDF"):
+        uploads.check(".pdf", 6 * MB)
+    with pytest.raises(UploadRejected, match="limit for IMAGE"):
+        uploads.check(".png", 2 * MB)
+    with pytest.raises(UploadRejected, match="not supported"):
+        uploads.check(".exe", 10)
+    assert uploads.rejected == 2
+
+
+def test_reserve_fails_fast_when_over_budget(tmp_path):
+    uploads = manager(tmp_path, max_in_flight=8 * MB)
+
+    async def scenario():
+        async with uploads.reserve(5 * MB):
+            with pytest.raises(UploadBudgetExceeded):
+                async with uploads.reserve(5 * MB):
+                    pass
+            assert uploads.in_flight_bytes == 5 * MB
+        # With nothing in flight a single upload is let through even if it alone is larger
+        async with uploads.reserve(9 * MB):
+            assert uploads.in_flight_bytes == 9 * MB
+        return uploads.in_flight_bytes
+
+    assert asyncio.run(scenario()) == 0
+    assert uploads.rejected == 1
+
+
+class BrokenDownload:
+    file_size = 4096
+
+    def __init__(self):
+        self.path = None
+
+    async def download_to_drive(self, path):
+        self.path = path
+        with open(path, "wb") as f:
+            f.write(b"%PDF partial")
+        raise ConnectionError("connection reset")
+
+
+def test_spooled_file_is_removed_when_download_fails(tmp_path):
+    uploads = manager(tmp_path)
+    file = BrokenDownload()
+
+    async def scenario():
+        with pytest.raises(ConnectionError):
+            async with uploads.download(file, ".pdf"):
+                pass
+
+    asyncio.run(scenario())
+    assert file.path is not None and not os.path.exists(file.path)
+    assert os.listdir(tmp_path) == []
+    assert uploads.in_flight_bytes == 0